@@ -0,0 +1,145 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, NamedTuple, Union
+
+import numpy as np
+
+
+class _EncodeRequest(NamedTuple):
+    texts: list[str]
+    future: Future
+    enqueued_at: float
+
+
+class EmbeddingBatcher:
+    """Single encoding worker that merges concurrent encode calls into one model batch.
+
+    Callers submit a list of texts and get a Future for its embeddings. The worker takes the
+    oldest request, then keeps collecting queued requests until the batch holds max_batch_size
+    texts or max_wait seconds have passed since it started waiting, encodes everything in one
+    call and hands each caller its own slice of the result.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[list[str]], np.ndarray],
+        max_batch_size: int = 64,
+        max_wait: float = 0.005,
+    ):
+        self._encode = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[Union[_EncodeRequest, None]]" = queue.Queue()
+        self._thread: Union[threading.Thread, None] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._queued_texts = 0
+        self.batches = 0
+        self.requests = 0
+        self.texts = 0
+        self.max_batch_texts = 0
+        self.max_batch_requests = 0
+        self.encode_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def submit(self, texts: list[str]) -> Future:
+        future: Future = Future()
+        if not texts:
+            future.set_result(np.empty((0, 0), dtype=np.float32))
+            return future
+        self.start()
+        with self._stats_lock:
+            self._queued_texts += len(texts)
+        self._queue.put(_EncodeRequest(list(texts), future, time.perf_counter()))
+        return future
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        return self.submit(texts).result()
+
+    async def aencode(self, texts: list[str]) -> np.ndarray:
+        return await asyncio.wrap_future(self.submit(texts))
+
+    def stats(self) -> dict[str, Union[int, float]]:
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queued_texts": self._queued_texts,
+                "batches": self.batches,
+                "requests": self.requests,
+                "texts": self.texts,
+                "mean_batch_texts": self.texts / self.batches if self.batches else 0.0,
+                "mean_batch_requests": self.requests / self.batches if self.batches else 0.0,
+                "max_batch_texts": self.max_batch_texts,
+                "max_batch_requests": self.max_batch_requests,
+                "mean_queue_wait_ms": self.wait_seconds / self.requests * 1000 if self.requests else 0.0,
+                "mean_encode_ms": self.encode_seconds / self.batches * 1000 if self.batches else 0.0,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+    def _collect(self, first: _EncodeRequest) -> tuple[list[_EncodeRequest], bool]:
+        # gather more requests behind the first one; a single oversized request is encoded on its own
+        batch = [first]
+        size = len(first.texts)
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+            size += len(request.texts)
+        return batch, False
+
+    def _run(self) -> None:
+        closing = False
+        while not closing:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, closing = self._collect(first)
+            started = time.perf_counter()
+            with self._stats_lock:
+                self._queued_texts -= sum(len(request.texts) for request in batch)
+            # skip callers that gave up (e.g. a cancelled request) so their texts are not encoded
+            batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+            texts = [text for request in batch for text in request.texts]
+            with self._stats_lock:
+                self.wait_seconds += sum(started - request.enqueued_at for request in batch)
+            if not batch:
+                continue
+            try:
+                embeddings = self._encode(texts)
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            with self._stats_lock:
+                self.encode_seconds += time.perf_counter() - started
+                self.batches += 1
+                self.requests += len(batch)
+                self.texts += len(texts)
+                self.max_batch_texts = max(self.max_batch_texts, len(texts))
+                self.max_batch_requests = max(self.max_batch_requests, len(batch))
+            offset = 0
+            for request in batch:
+                request.future.set_result(embeddings[offset:offset + len(request.texts)])
+                offset += len(request.texts)
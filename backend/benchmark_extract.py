@@ -0,0 +1,62 @@
+"""Compare the page extractors on real Wikipedia articles.
+
+Usage: python benchmark_extract.py [--repeat N] [URL ...]
+
+Each page is downloaded once (desktop HTML and MediaWiki API plain text), then every
+extractor is timed on the same bytes. Similarity is the Jaccard overlap of word tokens
+with the output of the current bs4 extractor, as a check that the text contract holds.
+"""
+import argparse
+import time
+
+import requests
+
+from bm25 import tokenize
+from extract import HTML_EXTRACTORS, extract_api_json, wiki_api_url
+
+DEFAULT_URLS = [
+    "https://en.wikipedia.org/wiki/Python_(programming_language)",
+    "https://en.wikipedia.org/wiki/Taiwan",
+    "https://zh.wikipedia.org/wiki/玉山",
+    "https://ja.wikipedia.org/wiki/富士山",
+]
+
+
+def similarity(a: str, b: str) -> float:
+    tokens_a, tokens_b = set(tokenize(a)), set(tokenize(b))
+    if not tokens_a and not tokens_b:
+        return 1.0
+    return len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+
+
+def time_extractor(extract, content: bytes, repeat: int) -> tuple[float, str]:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        page = extract(content)
+    return (time.perf_counter() - start) / repeat * 1000, page.text
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("urls", nargs="*", default=DEFAULT_URLS)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    session = requests.Session()
+    headers = {"User-Agent": "wiki-assistant/1.0 (https://github.com)"}
+    print(f"{'page':<45} {'extractor':<6} {'bytes':>9} {'ms':>8} {'chars':>8} {'sim':>5}")
+    for url in args.urls:
+        html = session.get(url, headers=headers, timeout=10).content
+        candidates = [(name, extract, html) for name, extract in HTML_EXTRACTORS.items()]
+        api_url = wiki_api_url(url)
+        if api_url is not None:
+            candidates.append(("api", extract_api_json, session.get(api_url, headers=headers, timeout=10).content))
+
+        _, baseline = time_extractor(HTML_EXTRACTORS["bs4"], html, 1)
+        for name, extract, content in candidates:
+            ms, text = time_extractor(extract, content, args.repeat)
+            print(f"{url[-45:]:<45} {name:<6} {len(content):>9} {ms:>8.1f} {len(text):>8} {similarity(baseline, text):>5.2f}")
+
+
+if __name__ == "__main__":
+    main()
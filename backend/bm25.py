@@ -0,0 +1,77 @@
+import math
+import re
+from collections import Counter
+
+import numpy as np
+
+
+# CJK text has no spaces between words, so runs of CJK characters are matched separately
+CJK_RANGES = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+TOKEN_PATTERN = re.compile(f"[{CJK_RANGES}]+|[^\\W_]+")
+CJK_PATTERN = re.compile(f"[{CJK_RANGES}]")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased word tokens; CJK runs become character unigrams plus bigrams."""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        if CJK_PATTERN.match(token):
+            tokens.extend(token)
+            tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+        else:
+            tokens.append(token)
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 inverted index over the chunks of one page."""
+
+    def __init__(self, chunks: list[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.num_docs = len(chunks)
+        self.doc_lengths = np.zeros(self.num_docs, dtype=np.float32)
+        self.postings: dict[str, list[tuple[int, int]]] = {}
+        for doc_id, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk))
+            self.doc_lengths[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((doc_id, tf))
+        self.avg_doc_length = float(self.doc_lengths.mean()) if self.num_docs else 0.0
+
+    def idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        if not self.num_docs:
+            return scores
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / max(self.avg_doc_length, 1e-9))
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            doc_ids = np.fromiter((doc_id for doc_id, _ in postings), dtype=np.int64, count=len(postings))
+            tfs = np.fromiter((tf for _, tf in postings), dtype=np.float32, count=len(postings))
+            scores[doc_ids] += self.idf(term) * tfs * (self.k1 + 1) / (tfs + norm[doc_ids])
+        return scores
+
+    def top_n(self, query: str, n: int) -> list[int]:
+        """Indices of the best matching chunks (only those sharing at least one term), best first."""
+        if n < 1:
+            raise ValueError(f"n must be at least 1, got {n}")
+        scores = self.scores(query)
+        matched = np.flatnonzero(scores > 0)
+        order = matched[np.argsort(-scores[matched], kind="stable")]
+        return order[:n].tolist()
+
+
+def reciprocal_rank_fusion(rankings: list[list[int]], k: int = 60) -> list[int]:
+    """Fuse several best-first rankings of the same items: score = sum of 1 / (k + rank)."""
+    fused: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused, key=fused.get, reverse=True)
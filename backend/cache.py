@@ -0,0 +1,535 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Union
+
+import numpy as np
+
+
+def temp_path(path: str) -> str:
+    # unique per process and thread, so concurrent writers of the same entry never share a temp file
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache holding at most ``max_items`` values."""
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DiskBudget:
+    """Keeps a cache directory under ``max_bytes`` by deleting its least recently used entries.
+
+    Files sharing a name stem (``<key>.npy`` and ``<key>.json``) form one entry and are removed
+    together. Entries are ordered by modification time, which the caches refresh on every disk
+    hit. The directory is only scanned after about a tenth of the budget has been written since
+    the last prune (and on the first write after a start); ``max_bytes`` <= 0 means no limit.
+    """
+
+    def __init__(self, cache_dir: Union[str, None], max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._written = max_bytes
+        self.disk_bytes = 0
+        self.pruned_entries = 0
+
+    @staticmethod
+    def touch(*paths: str) -> None:
+        for path in paths:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+    def record_write(self, nbytes: int) -> None:
+        if not self.cache_dir or self.max_bytes <= 0:
+            return
+        with self._lock:
+            self._written += nbytes
+            if self._written < self.max_bytes / 10:
+                return
+            self._written = 0
+        self.prune()
+
+    def prune(self) -> None:
+        # stem -> (bytes, newest mtime, paths); temp files of writes in progress are left alone
+        entries: dict[str, tuple[int, float, list[str]]] = {}
+        try:
+            with os.scandir(self.cache_dir) as scan:
+                for item in scan:
+                    if not item.is_file() or item.name.endswith(".tmp"):
+                        continue
+                    stem = item.name.split(".", 1)[0]
+                    stat = item.stat()
+                    size, mtime, paths = entries.get(stem, (0, 0.0, []))
+                    entries[stem] = (size + stat.st_size, max(mtime, stat.st_mtime), paths + [item.path])
+        except OSError as e:
+            print(f"Error scanning cache directory {self.cache_dir}: {e}")
+            return
+        total = sum(size for size, _, _ in entries.values())
+        pruned = 0
+        for size, _, paths in sorted(entries.values(), key=lambda entry: entry[1]):
+            if total <= self.max_bytes:
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"Error pruning cache file {path}: {e}")
+            total -= size
+            pruned += 1
+        with self._lock:
+            self.disk_bytes = total
+            self.pruned_entries += pruned
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "disk_bytes": self.disk_bytes,
+                "max_disk_bytes": self.max_bytes,
+                "pruned_entries": self.pruned_entries,
+            }
+
+
+class ChunkEmbeddingCache:
+    """LRU cache of per-page chunk embeddings with a byte budget and an optional disk tier.
+
+    Entries are keyed by (url, revision, chunking params, model name). Every entry is
+    also written to ``cache_dir`` so that, after a restart, it is loaded back
+    memory-mapped instead of being re-encoded. ``max_bytes`` bounds resident memory:
+    memory-mapped embeddings live in the page cache, so they are reported as
+    ``mapped_bytes`` and only their chunk text counts against the budget.
+    """
+
+    def __init__(self, max_bytes: int, cache_dir: Union[str, None] = None, max_disk_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.disk = DiskBudget(cache_dir, max_disk_bytes)
+        self._entries: OrderedDict[str, tuple[list[str], np.ndarray]] = OrderedDict()
+        # key -> (resident bytes, memory-mapped bytes)
+        self._sizes: dict[str, tuple[int, int]] = {}
+        self._total_bytes = 0
+        self._mapped_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(url: str, revision: str, chunk_params: dict, model_name: str) -> str:
+        raw = json.dumps([url, revision, chunk_params, model_name], sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Union[tuple[list[str], np.ndarray], None]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = self._load_from_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._insert(key, entry)
+        return entry
+
+    def put(self, key: str, chunks: list[str], embeddings: np.ndarray) -> None:
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self._save_to_disk(key, chunks, embeddings)
+        with self._lock:
+            self._insert(key, (chunks, embeddings))
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "mapped_bytes": self._mapped_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                **self.disk.stats(),
+            }
+
+    def _forget(self, key: str) -> None:
+        # caller must hold self._lock
+        resident, mapped = self._sizes.pop(key)
+        self._total_bytes -= resident
+        self._mapped_bytes -= mapped
+        del self._entries[key]
+
+    def _insert(self, key: str, entry: tuple[list[str], np.ndarray]) -> None:
+        # caller must hold self._lock
+        if key in self._entries:
+            self._forget(key)
+        chunks, embeddings = entry
+        resident = sum(len(chunk.encode("utf-8")) for chunk in chunks)
+        mapped = 0
+        if isinstance(embeddings, np.memmap):
+            mapped = embeddings.nbytes
+        else:
+            resident += embeddings.nbytes
+        self._entries[key] = entry
+        self._sizes[key] = (resident, mapped)
+        self._total_bytes += resident
+        self._mapped_bytes += mapped
+        # evict least recently used pages until we are back under budget (always keep the newest)
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            self._forget(next(iter(self._entries)))
+
+    def _paths(self, key: str) -> tuple[str, str]:
+        return (
+            os.path.join(self.cache_dir, f"{key}.npy"),
+            os.path.join(self.cache_dir, f"{key}.json"),
+        )
+
+    def _load_from_disk(self, key: str) -> Union[tuple[list[str], np.ndarray], None]:
+        if not self.cache_dir:
+            return None
+        embeddings_path, chunks_path = self._paths(key)
+        if not (os.path.exists(embeddings_path) and os.path.exists(chunks_path)):
+            return None
+        try:
+            with open(chunks_path, "r", encoding="utf-8") as f:
+                chunks = json.load(f)
+            embeddings = np.load(embeddings_path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            print(f"Error loading cached embeddings {key}: {e}")
+            return None
+        self.disk.touch(embeddings_path, chunks_path)
+        return chunks, embeddings
+
+    def _save_to_disk(self, key: str, chunks: list[str], embeddings: np.ndarray) -> None:
+        if not self.cache_dir:
+            return
+        embeddings_path, chunks_path = self._paths(key)
+        try:
+            # write to temp files and rename so a crash never leaves a half-written entry
+            embeddings_tmp_path, chunks_tmp_path = temp_path(embeddings_path), temp_path(chunks_path)
+            with open(embeddings_tmp_path, "wb") as f:
+                np.save(f, embeddings)
+            with open(chunks_tmp_path, "w", encoding="utf-8") as f:
+                json.dump(chunks, f)
+            os.replace(chunks_tmp_path, chunks_path)
+            os.replace(embeddings_tmp_path, embeddings_path)
+        except OSError as e:
+            print(f"Error saving cached embeddings {key}: {e}")
+            return
+        self.disk.record_write(embeddings.nbytes + sum(len(chunk) for chunk in chunks))
+
+
+class PageCache:
+    """Persistent, gzip-compressed cache of extracted page text with TTL and HTTP validators.
+
+    Within ``ttl`` seconds an entry is served without touching the network. After that
+    the caller revalidates it with the stored ETag/Last-Modified, so an unchanged page
+    costs a 304 instead of a full download and parse.
+    """
+
+    def __init__(self, cache_dir: Union[str, None], ttl: float, max_disk_bytes: int = 0):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.disk = DiskBudget(cache_dir, max_disk_bytes)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.bytes_downloaded = 0
+        self.bytes_saved = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json.gz")
+
+    def get(self, url: str) -> Union[dict, None]:
+        if not self.cache_dir:
+            return None
+        path = self._path(url)
+        if not os.path.exists(path):
+            return None
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error loading cached page {url}: {e}")
+            return None
+        if entry.get("url") != url:
+            return None
+        self.disk.touch(path)
+        return entry
+
+    def put(self, url: str, entry: dict) -> None:
+        if not self.cache_dir:
+            return
+        entry = {**entry, "url": url, "fetched_at": time.time()}
+        path = self._path(url)
+        tmp_path = temp_path(path)
+        try:
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+            self.disk.record_write(os.path.getsize(path))
+        except OSError as e:
+            print(f"Error saving cached page {url}: {e}")
+
+    def is_fresh(self, entry: dict) -> bool:
+        return time.time() - entry.get("fetched_at", 0) < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry: dict) -> dict[str, str]:
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def record_hit(self) -> None:
+        with self._lock:
+            self.hits += 1
+
+    def record_miss(self, downloaded: int) -> None:
+        with self._lock:
+            self.misses += 1
+            self.bytes_downloaded += downloaded
+
+    def record_revalidated(self, saved: int) -> None:
+        with self._lock:
+            self.revalidated += 1
+            self.bytes_saved += saved
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidated": self.revalidated,
+                "bytes_downloaded": self.bytes_downloaded,
+                "bytes_saved": self.bytes_saved,
+                **self.disk.stats(),
+            }
+
+
+class SearchCache:
+    """LRU + TTL cache of Wikipedia search results with an optional shared disk tier.
+
+    Entries are keyed by (language, normalized query, top_k). Within ``ttl`` seconds an
+    entry is fresh; for ``stale_ttl`` seconds after that it is still served, but the
+    caller is told to refresh it in the background (stale-while-revalidate). The disk tier
+    lets several backend processes, and restarts, share results.
+    """
+
+    def __init__(
+        self,
+        max_items: int,
+        ttl: float,
+        stale_ttl: float,
+        cache_dir: Union[str, None] = None,
+        max_disk_bytes: int = 0,
+    ):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.cache_dir = cache_dir
+        self.disk = DiskBudget(cache_dir, max_disk_bytes)
+        # key -> (urls, stored_at)
+        self._entries: OrderedDict[str, tuple[list[str], float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(language: str, query: str, top_k: int) -> str:
+        normalized = " ".join(query.casefold().split())
+        return json.dumps([language.lower(), normalized, top_k], ensure_ascii=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+    def _load(self, key: str) -> Union[tuple[list[str], float], None]:
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error loading cached search {key}: {e}")
+            return None
+        if entry.get("key") != key:
+            return None
+        self.disk.touch(path)
+        return entry["urls"], entry["stored_at"]
+
+    def _remember(self, key: str, urls: list[str], stored_at: float) -> None:
+        # caller must hold self._lock
+        self._entries[key] = (urls, stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_items:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Union[tuple[list[str], bool], None]:
+        """Return (urls, fresh) or None; a stale entry (fresh=False) should be refreshed by the caller."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        from_disk = False
+        if entry is None:
+            entry = self._load(key)
+            from_disk = entry is not None
+        age = time.time() - entry[1] if entry is not None else None
+        with self._lock:
+            if entry is None or age >= self.ttl + self.stale_ttl:
+                self.misses += 1
+                return None
+            if from_disk:
+                self.disk_hits += 1
+                self._remember(key, *entry)
+            fresh = age < self.ttl
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+            return list(entry[0]), fresh
+
+    def put(self, key: str, urls: list[str]) -> None:
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, list(urls), stored_at)
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        tmp_path = temp_path(path)
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"key": key, "urls": list(urls), "stored_at": stored_at}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            self.disk.record_write(os.path.getsize(path))
+        except OSError as e:
+            print(f"Error saving cached search {key}: {e}")
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                **self.disk.stats(),
+            }
+
+
+class AnswerCache:
+    """Semantic LRU + TTL cache of agent answers, matched by question embedding.
+
+    A lookup returns the answer whose question is most similar (cosine similarity of the
+    normalized embeddings) to the new question in the same language, provided the similarity
+    reaches ``threshold`` and the answer is younger than ``ttl`` seconds. Storing a question
+    that matches an existing one replaces that entry.
+    """
+
+    def __init__(self, max_items: int, ttl: float, threshold: float):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.threshold = threshold
+        # entry id -> (language, question embedding, answer entry, stored_at)
+        self._entries: OrderedDict[int, tuple[str, np.ndarray, dict, float]] = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def _best_match(self, language: str, embedding: np.ndarray) -> Union[tuple[int, float], None]:
+        # caller must hold self._lock; expired entries are dropped on the way
+        now = time.time()
+        for entry_id in [i for i, entry in self._entries.items() if now - entry[3] >= self.ttl]:
+            del self._entries[entry_id]
+        candidates = [(i, entry[1]) for i, entry in self._entries.items() if entry[0] == language]
+        if not candidates:
+            return None
+        similarities = np.stack([vector for _, vector in candidates]) @ np.asarray(embedding, dtype=np.float32)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+        return candidates[best][0], float(similarities[best])
+
+    def get(self, language: str, embedding: np.ndarray) -> Union[tuple[dict, float], None]:
+        """Return (answer entry, similarity) for the closest cached question, or None."""
+        with self._lock:
+            match = self._best_match(language.lower(), embedding)
+            if match is None:
+                self.misses += 1
+                return None
+            entry_id, similarity = match
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return dict(self._entries[entry_id][2]), similarity
+
+    def put(self, language: str, embedding: np.ndarray, question: str, answer: str, sources: list[str]) -> None:
+        language = language.lower()
+        entry = {"question": question, "answer": answer, "sources": list(sources)}
+        with self._lock:
+            match = self._best_match(language, embedding)
+            if match is not None:
+                del self._entries[match[0]]
+            self._entries[self._next_id] = (language, np.asarray(embedding, dtype=np.float32), entry, time.time())
+            self._next_id += 1
+            self.stores += 1
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, Union[int, float]]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "stores": self.stores,
+                "threshold": self.threshold,
+            }
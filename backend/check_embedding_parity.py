@@ -0,0 +1,93 @@
+"""Check that an embedding backend retrieves the same chunks as the PyTorch reference.
+
+Usage: python check_embedding_parity.py [--backend onnx-int8] [--top-k 5] [--min-overlap 0.9] [URL ...]
+
+Every page is chunked as /query does, then encoded by both torch and the candidate backend.
+For each query the top-k chunks of both are compared (overlap = |A & B| / k); the script exits
+with status 1 when the mean overlap falls below --min-overlap. Encode throughput is printed too.
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from config import CHUNK_MAX_TOKENS, EMBEDDING_MODEL
+from embedding import EMBEDDING_BACKENDS, intra_op_threads, load_embedding_model
+from utils import embed_texts, format_chunk, get_wiki_text_from_url, iter_text_chunks
+
+DEFAULT_PAGES = {
+    "https://en.wikipedia.org/wiki/Python_(programming_language)": [
+        "Who created Python?",
+        "What is the garbage collection strategy?",
+        "Which typing discipline does Python use?",
+    ],
+    "https://en.wikipedia.org/wiki/Taiwan": [
+        "What is the capital city?",
+        "When did martial law end?",
+        "What are the main exports?",
+    ],
+}
+
+
+def encode(texts: list[str], model) -> tuple[np.ndarray, float]:
+    start = time.perf_counter()
+    embeddings = embed_texts(texts, model)
+    return embeddings, time.perf_counter() - start
+
+
+def top_k(chunk_embeddings: np.ndarray, query_embedding: np.ndarray, k: int) -> set[int]:
+    return set(np.argsort(-(chunk_embeddings @ query_embedding))[:k].tolist())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("urls", nargs="*")
+    parser.add_argument("--backend", choices=[b for b in EMBEDDING_BACKENDS if b != "torch"], default="onnx-int8")
+    parser.add_argument("--query", action="append", dest="queries", help="query to check (repeatable)")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--min-overlap", type=float, default=0.9)
+    args = parser.parse_args()
+
+    if args.urls:
+        pages = {url: args.queries or [] for url in args.urls}
+    else:
+        pages = DEFAULT_PAGES
+    if not all(pages.values()):
+        parser.error("--query is required when URLs are given")
+
+    print(f"model={EMBEDDING_MODEL} threads={intra_op_threads()}")
+    reference = load_embedding_model(EMBEDDING_MODEL, "torch")
+    candidate = load_embedding_model(EMBEDDING_MODEL, args.backend)
+
+    overlaps = []
+    timings = {"torch": 0.0, args.backend: 0.0}
+    total_chunks = 0
+    for url, queries in pages.items():
+        chunks = [format_chunk(chunk) for chunk in iter_text_chunks(get_wiki_text_from_url(url), CHUNK_MAX_TOKENS)]
+        total_chunks += len(chunks)
+        ref_chunks, ref_seconds = encode(chunks, reference)
+        cand_chunks, cand_seconds = encode(chunks, candidate)
+        timings["torch"] += ref_seconds
+        timings[args.backend] += cand_seconds
+        cosine = float(np.mean(np.sum(ref_chunks * cand_chunks, axis=1)))
+        print(f"{url}: {len(chunks)} chunks, mean cosine to torch {cosine:.4f}")
+
+        ref_queries = embed_texts(queries, reference)
+        cand_queries = embed_texts(queries, candidate)
+        k = min(args.top_k, len(chunks))
+        for query, ref_query, cand_query in zip(queries, ref_queries, cand_queries):
+            overlap = len(top_k(ref_chunks, ref_query, k) & top_k(cand_chunks, cand_query, k)) / max(k, 1)
+            overlaps.append(overlap)
+            print(f"  {overlap:.2f}  {query}")
+
+    for backend, seconds in timings.items():
+        print(f"{backend:<10} {total_chunks / max(seconds, 1e-9):8.1f} chunks/s")
+    mean_overlap = float(np.mean(overlaps)) if overlaps else 1.0
+    print(f"mean top-{args.top_k} overlap: {mean_overlap:.3f} (min {args.min_overlap})")
+    if mean_overlap < args.min_overlap:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
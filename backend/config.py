@@ -0,0 +1,72 @@
+import os
+
+DATA_DIR = os.getenv("DATA_DIR", "data")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# Load the embedding model in the background at startup so the first /query is not slow; /health/ready
+# reports ready once it is loaded (right away when preloading is off). A failed load is retried
+# PRELOAD_EMBEDDING_ATTEMPTS times in total before /health/ready reports the error
+PRELOAD_EMBEDDING_MODEL = os.getenv("PRELOAD_EMBEDDING_MODEL", "true").lower() == "true"
+PRELOAD_EMBEDDING_ATTEMPTS = int(os.getenv("PRELOAD_EMBEDDING_ATTEMPTS", "3"))
+# Inference backend: "torch", "onnx" (ONNX Runtime) or "onnx-int8" (dynamically quantized ONNX weights);
+# check a backend against torch with check_embedding_parity.py before switching. The ONNX backends need the
+# "onnx" extra (poetry install --extras onnx; Dockerfile-backend installs it); the server refuses to start without it
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_INT8_FILE = os.getenv("EMBEDDING_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+# Intra-op threads of the encoding worker; 0 uses every CPU core
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+# Concurrent encode calls are merged into one batch of up to EMBEDDING_BATCH_MAX_SIZE texts,
+# waiting at most EMBEDDING_BATCH_MAX_WAIT_MS for more requests to arrive
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "64"))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))
+
+# Chunk embedding cache: hot pages stay in memory under this budget (pages reloaded from disk are
+# memory-mapped, so only their chunk text counts), all pages spill to disk; the least recently used
+# files are deleted once the disk tier exceeds EMBEDDING_CACHE_DISK_MAX_BYTES (0 = unlimited)
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(DATA_DIR, "embeddings"))
+EMBEDDING_CACHE_DISK_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_DISK_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+# Chunks follow section and sentence boundaries and hold at most this many (estimated) tokens;
+# all-MiniLM-L6-v2 truncates its input at 256 wordpieces
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+
+# Fetched page text is kept (gzip-compressed) for PAGE_CACHE_TTL seconds, then revalidated with ETag/Last-Modified
+PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", os.path.join(DATA_DIR, "pages"))
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", "3600"))
+PAGE_CACHE_DISK_MAX_BYTES = int(os.getenv("PAGE_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Wikipedia search results for /explore: fresh for SEARCH_CACHE_TTL seconds, then served stale for up to
+# SEARCH_CACHE_STALE_TTL more seconds while a background refresh runs; the disk tier is shared by every process
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "4096"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", str(6 * 3600)))
+SEARCH_CACHE_STALE_TTL = float(os.getenv("SEARCH_CACHE_STALE_TTL", str(7 * 24 * 3600)))
+SEARCH_CACHE_DIR = os.getenv("SEARCH_CACHE_DIR", os.path.join(DATA_DIR, "search"))
+SEARCH_CACHE_DISK_MAX_BYTES = int(os.getenv("SEARCH_CACHE_DISK_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Semantic answer cache used by the frontend (opt-in there): a question is answered from the cache when its
+# embedding has at least ANSWER_CACHE_THRESHOLD cosine similarity to a cached question in the same language
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+
+# "sqlite" (default) or "json"; the SQLite store imports HISTORY_FILE once on first start
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+HISTORY_FILE = os.getenv("HISTORY_FILE", os.path.join(DATA_DIR, "chat_history.json"))
+HISTORY_DB_FILE = os.getenv("HISTORY_DB_FILE", os.path.join(DATA_DIR, "chat_history.db"))
+
+# Async endpoints share one pooled HTTP/2 client to Wikipedia
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+# Pages prefetched by /explore?prefetch=true are loaded by at most this many background jobs at once
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "2"))
+
+# Cross-page vector index of every page seen so far; the oldest pages are dropped past this many bytes of
+# embeddings and chunk text. The index holds its own copy, in addition to EMBEDDING_CACHE_MAX_BYTES, so the
+# backend keeps up to the sum of both in memory (128 MiB holds roughly 50k all-MiniLM-L6-v2 chunks)
+VECTOR_INDEX_MAX_BYTES = int(os.getenv("VECTOR_INDEX_MAX_BYTES", str(128 * 1024 * 1024)))
+
+# Number of per-page BM25 indexes kept in memory for /query?mode=hybrid|prefilter
+BM25_CACHE_PAGES = int(os.getenv("BM25_CACHE_PAGES", "256"))
+
+# Page extraction: "lxml" (C parser) or "bs4" (pure-Python html.parser) for HTML pages;
+# PAGE_SOURCE=api fetches Wikipedia articles as plain text from the MediaWiki API instead of the skin HTML
+HTML_EXTRACTOR = os.getenv("HTML_EXTRACTOR", "lxml")
+PAGE_SOURCE = os.getenv("PAGE_SOURCE", "html")
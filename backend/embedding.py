@@ -0,0 +1,113 @@
+import importlib.util
+import os
+import threading
+import time
+from typing import Union
+
+from sentence_transformers import SentenceTransformer
+
+from config import EMBEDDING_BACKEND, EMBEDDING_INT8_FILE, EMBEDDING_THREADS
+
+
+# "torch" is the reference implementation; the ONNX Runtime paths need the backend's "onnx" extra
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# Process-wide registry: each (model, backend) is loaded once and shared by every request
+_models: dict[tuple[str, str], SentenceTransformer] = {}
+_models_lock = threading.Lock()
+# last error of a failed background preload, per (model, backend); cleared once the model loads
+_preload_errors: dict[tuple[str, str], str] = {}
+
+
+def intra_op_threads() -> int:
+    if EMBEDDING_THREADS > 0:
+        return EMBEDDING_THREADS
+    # encodes run one batch at a time on a single worker, so that batch can use every core
+    return os.cpu_count() or 1
+
+
+def embedding_model_id(name: str, backend: str = EMBEDDING_BACKEND) -> str:
+    # used in cache keys: the ONNX and int8 vectors differ slightly from the torch ones
+    return name if backend == "torch" else f"{name}@{backend}"
+
+
+def check_embedding_backend(backend: str = EMBEDDING_BACKEND) -> None:
+    """Raise if the backend is unknown or its packages are not installed; called at startup to fail fast."""
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {EMBEDDING_BACKENDS}")
+    if backend == "torch":
+        return
+    missing = [module for module in ("onnxruntime", "optimum") if importlib.util.find_spec(module) is None]
+    if missing:
+        raise RuntimeError(
+            f"Embedding backend {backend!r} needs the backend's onnx extra (poetry install --extras onnx); "
+            f"missing: {', '.join(missing)}"
+        )
+
+
+def load_embedding_model(name: str, backend: str) -> SentenceTransformer:
+    check_embedding_backend(backend)
+    threads = intra_op_threads()
+    if backend == "torch":
+        import torch
+
+        torch.set_num_threads(threads)
+        return SentenceTransformer(name)
+
+    from onnxruntime import ExecutionMode, SessionOptions
+
+    options = SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    options.execution_mode = ExecutionMode.ORT_SEQUENTIAL
+    model_kwargs = {"provider": "CPUExecutionProvider", "session_options": options}
+    if backend == "onnx-int8":
+        # dynamically quantized weights published alongside the model, or exported with
+        # sentence_transformers.export_dynamic_quantized_onnx_model for other models
+        model_kwargs["file_name"] = EMBEDDING_INT8_FILE
+    return SentenceTransformer(name, backend="onnx", model_kwargs=model_kwargs)
+
+
+def get_embedding_model(name: str, backend: str = EMBEDDING_BACKEND) -> SentenceTransformer:
+    model = _models.get((name, backend))
+    if model is not None:
+        return model
+    with _models_lock:
+        # another thread may have finished loading while we waited for the lock
+        model = _models.get((name, backend))
+        if model is None:
+            model = load_embedding_model(name, backend)
+            _models[(name, backend)] = model
+    return model
+
+
+def is_model_loaded(name: str, backend: str = EMBEDDING_BACKEND) -> bool:
+    return (name, backend) in _models
+
+
+def preload_error(name: str, backend: str = EMBEDDING_BACKEND) -> Union[str, None]:
+    return _preload_errors.get((name, backend))
+
+
+def _preload(name: str, backend: str, attempts: int, retry_delay: float) -> None:
+    for attempt in range(1, attempts + 1):
+        try:
+            get_embedding_model(name, backend)
+        except Exception as e:
+            _preload_errors[(name, backend)] = f"{type(e).__name__}: {e}"
+            print(f"Error loading embedding model {name} ({backend}), attempt {attempt} of {attempts}: {e}")
+            if attempt < attempts:
+                time.sleep(retry_delay * attempt)
+        else:
+            _preload_errors.pop((name, backend), None)
+            return
+
+
+def preload_embedding_model(
+    name: str, backend: str = EMBEDDING_BACKEND, attempts: int = 3, retry_delay: float = 5.0
+) -> threading.Thread:
+    # load in a background thread so the server starts accepting requests immediately; failed loads
+    # are retried with a growing delay and the last error is kept for /health/ready
+    thread = threading.Thread(target=_preload, args=(name, backend, attempts, retry_delay), daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import re
+from typing import Callable, NamedTuple, Union
+from urllib.parse import unquote, urlencode, urlparse
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+except ImportError:  # lxml is optional; the bs4 extractor is always available
+    lxml = None
+
+
+# Every extractor returns the same text contract: one line per paragraph, with
+# sections marked by "## " (h2) and "### " (h3) heading lines.
+
+# Page indicators (protection lock, good/featured article star) sit in their own
+# .mw-parser-output before the article body, so the body is looked up inside #mw-content-text.
+CONTENT_ROOT_SELECTOR = "#mw-content-text .mw-parser-output"
+
+REVISION_PATTERN = re.compile(r'"wgRevisionId":\s*(\d+)')
+API_HEADING_PATTERN = re.compile(r"^(={2,})\s*(.*?)\s*=+$")
+WIKI_PATH_PATTERN = re.compile(r"^/wiki/(.+)$")
+
+
+class ExtractedPage(NamedTuple):
+    text: str
+    revision: str
+
+
+def _revision_from_html(content: bytes, text: str) -> str:
+    # MediaWiki embeds the revision id in the page config; fall back to a content hash
+    match = REVISION_PATTERN.search(content.decode("utf-8", errors="ignore"))
+    if match:
+        return match.group(1)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _heading_line(level: int, text: str) -> str:
+    return f"{'#' * level} {text.strip()}"
+
+
+def extract_html_bs4(content: bytes) -> ExtractedPage:
+    """Pure-Python extractor using BeautifulSoup's html.parser."""
+    soup = BeautifulSoup(content, "html.parser")
+    root = soup.select_one(CONTENT_ROOT_SELECTOR) or soup.select_one(".mw-parser-output") or soup
+    for edit_link in root.select(".mw-editsection"):
+        edit_link.decompose()
+    lines = []
+    for element in root.find_all(["h2", "h3", "p"]):
+        text = element.get_text()
+        if not text.strip():
+            continue
+        if element.name == "p":
+            lines.append(text)
+        else:
+            lines.append(_heading_line(int(element.name[1]), text))
+    wiki_text = "\n".join(lines)
+    return ExtractedPage(text=wiki_text, revision=_revision_from_html(content, wiki_text))
+
+
+def _has_class(name: str) -> str:
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+
+def extract_html_lxml(content: bytes) -> ExtractedPage:
+    """Same output as extract_html_bs4, using lxml's C parser."""
+    try:
+        tree = lxml.html.document_fromstring(content.decode("utf-8"))
+    except UnicodeDecodeError:
+        tree = lxml.html.document_fromstring(content)
+    roots = tree.xpath(f"//*[@id='mw-content-text']//*[{_has_class('mw-parser-output')}]")
+    roots = roots or tree.xpath(f"//*[{_has_class('mw-parser-output')}]")
+    root = roots[0] if roots else tree
+    for edit_link in root.xpath(f".//*[{_has_class('mw-editsection')}]"):
+        edit_link.drop_tree()
+    # text_content() includes inline TemplateStyles and scripts, which bs4's get_text() skips
+    for element in list(root.iter("style", "script")):
+        element.drop_tree()
+    lines = []
+    for element in root.iter("h2", "h3", "p"):
+        text = element.text_content()
+        if not text.strip():
+            continue
+        if element.tag == "p":
+            lines.append(text)
+        else:
+            lines.append(_heading_line(int(element.tag[1]), text))
+    wiki_text = "\n".join(lines)
+    return ExtractedPage(text=wiki_text, revision=_revision_from_html(content, wiki_text))
+
+
+def wiki_api_url(url: str) -> Union[str, None]:
+    """MediaWiki API URL returning the plain-text extract and revision id of a Wikipedia article URL."""
+    parsed = urlparse(url)
+    match = WIKI_PATH_PATTERN.match(parsed.path)
+    if not parsed.netloc.endswith(".wikipedia.org") or not match:
+        return None
+    host = parsed.netloc.replace(".m.wikipedia.org", ".wikipedia.org")
+    params = {
+        "action": "query",
+        "prop": "extracts|revisions",
+        "explaintext": 1,
+        "exsectionformat": "wiki",
+        "rvprop": "ids",
+        "redirects": 1,
+        "titles": unquote(match.group(1)).replace("_", " "),
+        "format": "json",
+        "formatversion": 2,
+    }
+    return f"https://{host}/w/api.php?{urlencode(params)}"
+
+
+def is_wiki_api_url(url: str) -> bool:
+    return "/w/api.php" in url
+
+
+def extract_api_json(content: bytes) -> ExtractedPage:
+    """Extractor for the TextExtracts plain-text output requested by wiki_api_url."""
+    data = json.loads(content)
+    pages = data.get("query", {}).get("pages", [])
+    if not pages or pages[0].get("missing"):
+        raise ValueError("Page not found")
+    page = pages[0]
+    lines = []
+    for line in page.get("extract", "").split("\n"):
+        if not line.strip():
+            continue
+        heading = API_HEADING_PATTERN.match(line)
+        if heading is None:
+            lines.append(line)
+        elif len(heading.group(1)) <= 3:
+            lines.append(_heading_line(len(heading.group(1)), heading.group(2)))
+        # deeper headings have no HTML-extractor equivalent (we only keep h2/h3), so they are dropped
+    wiki_text = "\n".join(lines)
+    revisions = page.get("revisions") or [{}]
+    revision = revisions[0].get("revid")
+    if revision is None:
+        revision = hashlib.sha1(wiki_text.encode("utf-8")).hexdigest()
+    return ExtractedPage(text=wiki_text, revision=str(revision))
+
+
+HTML_EXTRACTORS: dict[str, Callable[[bytes], ExtractedPage]] = {"bs4": extract_html_bs4}
+if lxml is not None:
+    HTML_EXTRACTORS["lxml"] = extract_html_lxml
+
+
+def get_html_extractor(name: str) -> Callable[[bytes], ExtractedPage]:
+    if name not in HTML_EXTRACTORS:
+        print(f"HTML extractor {name!r} is not available; falling back to bs4")
+        return extract_html_bs4
+    return HTML_EXTRACTORS[name]
@@ -0,0 +1,161 @@
+import threading
+from typing import Union
+
+import numpy as np
+
+
+class VectorIndex:
+    """Cross-page index of normalized chunk embeddings in one contiguous float32 matrix.
+
+    Each row carries (url id, chunk offset) metadata, so a search over any subset of
+    pages is a single matrix-vector product plus a mask. Re-indexing a page with a new
+    revision tombstones its old rows; they are dropped on the next compaction.
+
+    The index keeps its own copy of every page's embeddings and chunk text, bounded by
+    max_bytes: the oldest pages are dropped to make room, and the matrix never grows past
+    the rows that fit in the budget (unless a single page needs more).
+    """
+
+    def __init__(self, max_bytes: int, initial_capacity: int = 1024):
+        self.max_bytes = max_bytes
+        self._initial_capacity = initial_capacity
+        self._matrix: Union[np.ndarray, None] = None
+        self._url_ids = np.empty(0, dtype=np.int32)
+        self._offsets = np.empty(0, dtype=np.int32)
+        self._alive = np.empty(0, dtype=bool)
+        self._size = 0
+        self._live_rows = 0
+        self._live_bytes = 0
+        # url -> (cache key, first row, row count, chunks, bytes); insertion order is used for eviction
+        self._pages: dict[str, tuple[str, int, int, list[str], int]] = {}
+        self._url_to_id: dict[str, int] = {}
+        self._id_to_url: list[str] = []
+        self._lock = threading.Lock()
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._pages
+
+    def add_page(self, url: str, key: str, chunks: list[str], embeddings: np.ndarray) -> None:
+        with self._lock:
+            existing = self._pages.get(url)
+            if existing is not None and existing[0] == key:
+                return
+            if existing is not None:
+                self._remove_page(url)
+            if len(chunks) == 0:
+                self._pages[url] = (key, self._size, 0, chunks, 0)
+                return
+
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+            dim = embeddings.shape[1]
+            page_bytes = len(chunks) * self._row_bytes(dim) + sum(len(chunk.encode("utf-8")) for chunk in chunks)
+            # drop the oldest pages until the new one fits the budget
+            while self._pages and self._live_bytes + page_bytes > self.max_bytes:
+                self._remove_page(next(iter(self._pages)))
+            capacity = 0 if self._matrix is None else len(self._matrix)
+            if self._size + len(chunks) > capacity and self._size > self._live_rows:
+                # reuse the rows of dropped pages before growing the matrix
+                self._compact()
+            self._reserve(self._size + len(chunks), dim)
+            start, stop = self._size, self._size + len(chunks)
+            url_id = self._url_to_id.setdefault(url, len(self._id_to_url))
+            if url_id == len(self._id_to_url):
+                self._id_to_url.append(url)
+            self._matrix[start:stop] = embeddings
+            self._url_ids[start:stop] = url_id
+            self._offsets[start:stop] = np.arange(len(chunks), dtype=np.int32)
+            self._alive[start:stop] = True
+            self._size = stop
+            self._live_rows += len(chunks)
+            self._live_bytes += page_bytes
+            self._pages[url] = (key, start, len(chunks), chunks, page_bytes)
+
+            if self._size - self._live_rows > self._size // 2:
+                self._compact()
+
+    def search(
+        self, query_embedding: np.ndarray, urls: Union[list[str], None] = None, top_k: int = 5
+    ) -> list[dict[str, Union[str, int, float]]]:
+        with self._lock:
+            if self._matrix is None or self._live_rows == 0:
+                return []
+            scores = self._matrix[:self._size] @ np.asarray(query_embedding, dtype=np.float32)
+            mask = self._alive[:self._size].copy()
+            if urls is not None:
+                wanted = [self._url_to_id[url] for url in urls if url in self._url_to_id]
+                mask &= np.isin(self._url_ids[:self._size], wanted)
+            candidates = np.flatnonzero(mask)
+            if len(candidates) == 0:
+                return []
+            k = min(top_k, len(candidates))
+            top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            top = top[np.argsort(-scores[top])]
+            results = []
+            for row in top:
+                url = self._id_to_url[self._url_ids[row]]
+                offset = int(self._offsets[row])
+                results.append({
+                    "url": url,
+                    "offset": offset,
+                    "chunk": self._pages[url][3][offset],
+                    "score": float(scores[row]),
+                })
+            return results
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            capacity = 0 if self._matrix is None else len(self._matrix)
+            return {
+                "pages": len(self._pages),
+                "rows": self._live_rows,
+                "dead_rows": self._size - self._live_rows,
+                "capacity": capacity,
+                "bytes": self._live_bytes,
+                "allocated_bytes": 0 if self._matrix is None else capacity * self._row_bytes(self._matrix.shape[1]),
+                "max_bytes": self.max_bytes,
+            }
+
+    @staticmethod
+    def _row_bytes(dim: int) -> int:
+        # float32 embedding plus the url id, offset and alive flag of the row
+        return dim * 4 + 4 + 4 + 1
+
+    def _reserve(self, rows: int, dim: int) -> None:
+        # caller must hold self._lock; grow geometrically so appends stay amortized O(1),
+        # but not past the rows that fit in max_bytes
+        capacity = 0 if self._matrix is None else len(self._matrix)
+        if rows <= capacity:
+            return
+        max_capacity = max(self.max_bytes // self._row_bytes(dim), rows)
+        new_capacity = min(max(self._initial_capacity, capacity * 2, rows), max_capacity)
+        matrix = np.zeros((new_capacity, dim), dtype=np.float32)
+        url_ids = np.zeros(new_capacity, dtype=np.int32)
+        offsets = np.zeros(new_capacity, dtype=np.int32)
+        alive = np.zeros(new_capacity, dtype=bool)
+        if self._matrix is not None:
+            matrix[:self._size] = self._matrix[:self._size]
+            url_ids[:self._size] = self._url_ids[:self._size]
+            offsets[:self._size] = self._offsets[:self._size]
+            alive[:self._size] = self._alive[:self._size]
+        self._matrix, self._url_ids, self._offsets, self._alive = matrix, url_ids, offsets, alive
+
+    def _remove_page(self, url: str) -> None:
+        # caller must hold self._lock
+        _, start, count, _, page_bytes = self._pages.pop(url)
+        self._alive[start:start + count] = False
+        self._live_rows -= count
+        self._live_bytes -= page_bytes
+
+    def _compact(self) -> None:
+        # caller must hold self._lock; rewrite live rows contiguously and fix up page ranges
+        keep = np.flatnonzero(self._alive[:self._size])
+        new_rows = np.full(self._size, -1, dtype=np.int64)
+        new_rows[keep] = np.arange(len(keep))
+        self._matrix[:len(keep)] = self._matrix[keep]
+        self._url_ids[:len(keep)] = self._url_ids[keep]
+        self._offsets[:len(keep)] = self._offsets[keep]
+        self._alive[:len(keep)] = True
+        self._alive[len(keep):self._size] = False
+        self._size = len(keep)
+        for url, (key, start, count, chunks, page_bytes) in self._pages.items():
+            self._pages[url] = (key, int(new_rows[start]) if count else self._size, count, chunks, page_bytes)
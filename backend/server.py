@@ -1,72 +1,502 @@
-from typing import Union
+import asyncio
+import functools
+import hashlib
+import json
+import threading
+from contextlib import asynccontextmanager
+from typing import Literal, Union
 
-from fastapi import FastAPI
+import httpx
+import numpy as np
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
 
+from batcher import EmbeddingBatcher
+from bm25 import BM25Index
+from cache import AnswerCache, ChunkEmbeddingCache, LRUCache, SearchCache
+from config import (
+    ANSWER_CACHE_SIZE,
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL,
+    BM25_CACHE_PAGES,
+    CHUNK_MAX_TOKENS,
+    EMBEDDING_BACKEND,
+    EMBEDDING_BATCH_MAX_SIZE,
+    EMBEDDING_BATCH_MAX_WAIT_MS,
+    EMBEDDING_CACHE_DIR,
+    EMBEDDING_CACHE_DISK_MAX_BYTES,
+    EMBEDDING_CACHE_MAX_BYTES,
+    EMBEDDING_MODEL,
+    HISTORY_DB_FILE,
+    HISTORY_FILE,
+    HTTP_MAX_CONNECTIONS,
+    PREFETCH_WORKERS,
+    PRELOAD_EMBEDDING_ATTEMPTS,
+    PRELOAD_EMBEDDING_MODEL,
+    SEARCH_CACHE_DIR,
+    SEARCH_CACHE_DISK_MAX_BYTES,
+    SEARCH_CACHE_SIZE,
+    SEARCH_CACHE_STALE_TTL,
+    SEARCH_CACHE_TTL,
+    STORAGE_BACKEND,
+    VECTOR_INDEX_MAX_BYTES,
+)
+from index import VectorIndex
+from singleflight import SingleFlight
+from embedding import (
+    check_embedding_backend,
+    embedding_model_id,
+    get_embedding_model,
+    intra_op_threads,
+    is_model_loaded,
+    preload_embedding_model,
+    preload_error,
+)
+from storage import ALL_FOLDERS, VersionConflict, open_store
 from utils import (
-    get_wiki_text_from_url,
-    split_text_into_chunks,
-    query_chunks_with_query,
-    search_for_wikipedia_page_url,
+    TEXT_FORMAT,
+    aget_wiki_page,
+    asearch_for_wikipedia_page_url,
+    create_async_http_client,
+    embed_texts,
+    format_chunk,
+    hybrid_query_chunks,
+    iter_text_chunks,
+    page_cache,
+    score_chunks,
+    search_chunks,
 )
 
-app = FastAPI()
+# Shared, pooled HTTP client for Wikipedia; created and closed with the app
+http_client: Union[httpx.AsyncClient, None] = None
+# background load of the embedding model started with the app (PRELOAD_EMBEDDING_MODEL)
+preload_thread: Union[threading.Thread, None] = None
 
-import json
-import os
 
-import uuid
-from datetime import datetime
+def encode_texts(texts: list[str]) -> np.ndarray:
+    return embed_texts(texts, get_embedding_model(EMBEDDING_MODEL))
 
-HISTORY_FILE = "data/chat_history.json"
 
-def load_data():
-    if os.path.exists(HISTORY_FILE):
-        try:
-            with open(HISTORY_FILE, "r") as f:
-                data = json.load(f)
-                # Check if data is in the new format (dict with "sessions")
-                if isinstance(data, dict) and "sessions" in data:
-                    return data
-                # If it's a list (old format) or other invalid format, reset
-                print("Detected old or invalid data format. Resetting chat history.")
-                return {"sessions": {}}
-        except Exception as e:
-            print(f"Error loading data: {e}. Resetting chat history.")
-            return {"sessions": {}}
-    return {"sessions": {}}
-
-def save_data(data):
-    with open(HISTORY_FILE, "w") as f:
-        json.dump(data, f)
-
-# Initialize data
-db = load_data()
-if "folders" not in db:
-    db["folders"] = {}
-    save_data(db)
+# Every encode goes through one worker thread, which merges concurrent requests into shared batches
+embedding_batcher = EmbeddingBatcher(encode_texts, EMBEDDING_BATCH_MAX_SIZE, EMBEDDING_BATCH_MAX_WAIT_MS / 1000)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global http_client, preload_thread
+    # a misconfigured EMBEDDING_BACKEND stops the server here instead of failing every /query
+    check_embedding_backend()
+    http_client = create_async_http_client(HTTP_MAX_CONNECTIONS)
+    if PRELOAD_EMBEDDING_MODEL:
+        preload_thread = preload_embedding_model(EMBEDDING_MODEL, attempts=PRELOAD_EMBEDDING_ATTEMPTS)
+    embedding_batcher.start()
+    yield
+    for job in [*prefetch_jobs.values(), *search_refreshes]:
+        job.cancel()
+    await http_client.aclose()
+    await asyncio.to_thread(embedding_batcher.close)
+
+
+app = FastAPI(lifespan=lifespan)
+
+embedding_cache = ChunkEmbeddingCache(
+    EMBEDDING_CACHE_MAX_BYTES, EMBEDDING_CACHE_DIR or None, EMBEDDING_CACHE_DISK_MAX_BYTES
+)
+CHUNK_PARAMS = {"max_tokens": CHUNK_MAX_TOKENS}
+# cached chunks depend on the extracted text as well, so pages extracted differently get new keys
+CHUNK_KEY_PARAMS = {**CHUNK_PARAMS, "text_format": TEXT_FORMAT}
+EMBEDDING_MODEL_ID = embedding_model_id(EMBEDDING_MODEL)
+# every page loaded by /query, /query/batch or /search is added here for cross-page retrieval; adding
+# (matrix growth, compaction) and searching copy or scan the whole matrix, so both run in worker threads
+vector_index = VectorIndex(VECTOR_INDEX_MAX_BYTES)
+# per-page BM25 indexes for the hybrid and prefilter query modes, keyed like the embedding cache
+bm25_cache = LRUCache(BM25_CACHE_PAGES)
+# url -> background fetch/chunk/embed job started by /explore?prefetch=true; at most
+# PREFETCH_WORKERS run at once (prefetch_running). A /query for the same url waits for a running
+# job, and takes over from a job still queued for a slot by cancelling it and loading the page itself
+prefetch_jobs: dict[str, asyncio.Task] = {}
+prefetch_running: set[str] = set()
+prefetch_slots = asyncio.Semaphore(PREFETCH_WORKERS)
+prefetch_stats = {"started": 0, "completed": 0, "failed": 0, "skipped": 0, "awaited": 0, "taken_over": 0}
+# concurrent requests for the same page share one fetch/parse/chunk (keyed by url) and one encode
+# (keyed by the embedding cache key: url, revision, chunk params and model)
+page_flights = SingleFlight()
+encode_flights = SingleFlight()
+bm25_flights = SingleFlight()
+# /explore search results, refreshed in the background once stale; searches for the same key are coalesced
+search_cache = SearchCache(
+    SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL, SEARCH_CACHE_STALE_TTL, SEARCH_CACHE_DIR or None, SEARCH_CACHE_DISK_MAX_BYTES
+)
+search_flights = SingleFlight()
+search_refreshes: set[asyncio.Task] = set()
+# agent answers, looked up by question similarity before the frontend runs the agent
+answer_cache = AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_THRESHOLD)
+
+store = open_store(STORAGE_BACKEND, HISTORY_DB_FILE, HISTORY_FILE)
 
 @app.get("/")
 def read_root() -> dict[str, str]:
     return {"message": "Welcome to the Wiki Assistant API"}
 
 
+@app.get("/health/live")
+def liveness() -> dict[str, str]:
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+def readiness():
+    # With preloading, only report ready once the embedding model is in memory, so /query will not
+    # block on a load; without it nothing loads the model before the first /query, so it is ready now
+    status = {"model": EMBEDDING_MODEL, "backend": EMBEDDING_BACKEND}
+    if is_model_loaded(EMBEDDING_MODEL) or preload_thread is None:
+        return {"status": "ready", **status}
+    error = preload_error(EMBEDDING_MODEL)
+    if error is not None:
+        status["error"] = error
+    failed = error is not None and not preload_thread.is_alive()
+    return JSONResponse(status_code=503, content={"status": "failed" if failed else "loading", **status})
+
+
+@app.get("/metrics")
+def metrics() -> dict[str, dict]:
+    return {
+        "embedding_cache": embedding_cache.stats(),
+        "page_cache": page_cache.stats(),
+        "search_cache": search_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "vector_index": vector_index.stats(),
+        "embedding": {
+            "model": EMBEDDING_MODEL,
+            "backend": EMBEDDING_BACKEND,
+            "threads": intra_op_threads(),
+        },
+        "embedding_batcher": embedding_batcher.stats(),
+        "prefetch": {**prefetch_stats, "in_flight": len(prefetch_jobs), "running": len(prefetch_running)},
+        "single_flight": {
+            "page_fetch": page_flights.stats(),
+            "page_encode": encode_flights.stats(),
+            "bm25_build": bm25_flights.stats(),
+            "search": search_flights.stats(),
+        },
+    }
+
+
+async def wait_for_prefetch(urls: list[str]) -> None:
+    jobs = []
+    for url in urls:
+        job = prefetch_jobs.get(url)
+        if job is None:
+            continue
+        if url in prefetch_running:
+            jobs.append(job)
+        else:
+            # still waiting for a slot: loading the page now is faster than queueing behind other pages
+            prefetch_jobs.pop(url)
+            job.cancel()
+            prefetch_stats["taken_over"] += 1
+    if jobs:
+        prefetch_stats["awaited"] += len(jobs)
+        # asyncio.wait neither raises the jobs' errors nor cancels them if this request is cancelled
+        await asyncio.wait(jobs)
+
+
+async def fetch_pages_chunks(
+    urls: list[str], wait: bool = True
+) -> dict[str, Union[tuple[str, list[str], Union[np.ndarray, None]], Exception]]:
+    # Fetch all pages concurrently and return (cache key, chunks, embeddings or None) per page;
+    # chunks and embeddings come from the cache when this page revision was seen before
+    if wait:
+        await wait_for_prefetch(urls)
+    pages = await asyncio.gather(
+        *(page_flights.do(url, functools.partial(fetch_page_chunks, url)) for url in urls),
+        return_exceptions=True,
+    )
+    return dict(zip(urls, pages))
+
+
+async def fetch_page_chunks(url: str) -> tuple[str, list[str], Union[np.ndarray, None]]:
+    page = await aget_wiki_page(url, http_client)
+    key = ChunkEmbeddingCache.make_key(url, page.revision, CHUNK_KEY_PARAMS, EMBEDDING_MODEL_ID)
+    cached = await asyncio.to_thread(embedding_cache.get, key)
+    if cached is not None:
+        await asyncio.to_thread(vector_index.add_page, url, key, *cached)
+        return (key, *cached)
+    chunks = [format_chunk(chunk) for chunk in iter_text_chunks(page.text, **CHUNK_PARAMS)]
+    return key, chunks, None
+
+
+async def encode_page_chunks(url: str, key: str, chunks: list[str]) -> np.ndarray:
+    chunk_embeddings = await embedding_batcher.aencode(chunks)
+    await asyncio.to_thread(embedding_cache.put, key, chunks, chunk_embeddings)
+    await asyncio.to_thread(vector_index.add_page, url, key, chunks, chunk_embeddings)
+    return chunk_embeddings
+
+
+async def load_pages_chunks(
+    urls: list[str], wait: bool = True
+) -> dict[str, Union[tuple[str, list[str], np.ndarray], Exception]]:
+    # Like fetch_pages_chunks, but uncached pages are encoded too; their encodes are submitted
+    # together, so the embedding batcher merges them into shared batches
+    results = await fetch_pages_chunks(urls, wait=wait)
+    pending = [
+        (url, page[0], page[1])
+        for url, page in results.items()
+        if not isinstance(page, Exception) and page[2] is None
+    ]
+    if pending:
+        all_embeddings = await asyncio.gather(*(
+            encode_flights.do(key, functools.partial(encode_page_chunks, url, key, chunks))
+            for url, key, chunks in pending
+        ))
+        for (url, key, chunks), chunk_embeddings in zip(pending, all_embeddings):
+            results[url] = (key, chunks, chunk_embeddings)
+    return results
+
+
+async def load_page_chunks(url: str) -> tuple[str, list[str], np.ndarray]:
+    result = (await load_pages_chunks([url]))[url]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+async def get_bm25_index(key: str, chunks: list[str]) -> BM25Index:
+    bm25_index = bm25_cache.get(key)
+    if bm25_index is None:
+        bm25_index = await bm25_flights.do(key, functools.partial(asyncio.to_thread, BM25Index, chunks))
+        bm25_cache.put(key, bm25_index)
+    return bm25_index
+
+
+def scored_chunks_response(scored: list[tuple[str, float]], with_scores: bool) -> dict:
+    response = {"relevant_chunks": [chunk for chunk, _ in scored] or None}
+    if with_scores:
+        response["scores"] = [score for _, score in scored]
+    return response
+
+
 @app.get("/query")
-def query_wiki(url: str, query: str) -> dict[str, Union[list[str] | str, None]]:
+async def query_wiki(
+    url: str,
+    query: str,
+    mode: Literal["dense", "hybrid", "prefilter"] = "dense",
+    prefilter_n: int = Query(20, ge=1),
+) -> dict[str, Union[list[str] | str, None]]:
+    # dense: embedding similarity over every chunk
+    # hybrid: reciprocal-rank fusion of the dense and BM25 rankings
+    # prefilter: only the top prefilter_n BM25 candidates are densely encoded and ranked
     try:
-        wiki_text = get_wiki_text_from_url(url)
-        chunks = split_text_into_chunks(wiki_text)
-        relevant_chunks = query_chunks_with_query(chunks, query)
+        if mode == "prefilter":
+            page = (await fetch_pages_chunks([url]))[url]
+            if isinstance(page, Exception):
+                raise page
+            key, chunks, chunk_embeddings = page
+            bm25_index = await get_bm25_index(key, chunks)
+            candidates = bm25_index.top_n(query, prefilter_n)
+            if candidates:
+                candidate_chunks = [chunks[i] for i in candidates]
+                if chunk_embeddings is None:
+                    # the query and the candidate chunks share one encode call
+                    embeddings = await embedding_batcher.aencode([query, *candidate_chunks])
+                    query_embedding, candidate_embeddings = embeddings[0], embeddings[1:]
+                else:
+                    query_embedding = (await embedding_batcher.aencode([query]))[0]
+                    candidate_embeddings = chunk_embeddings[candidates]
+                relevant_chunks = search_chunks(candidate_chunks, candidate_embeddings, query_embedding)
+                return {"relevant_chunks": relevant_chunks}
+            # no lexical match at all: fall back to dense retrieval over the whole page
+
+        key, chunks, chunk_embeddings = await load_page_chunks(url)
+        query_embedding = (await embedding_batcher.aencode([query]))[0]
+        if mode == "hybrid":
+            bm25_index = await get_bm25_index(key, chunks)
+            relevant_chunks = hybrid_query_chunks(chunks, query, chunk_embeddings, bm25_index, query_embedding)
+        else:
+            relevant_chunks = search_chunks(chunks, chunk_embeddings, query_embedding)
         return {"relevant_chunks": relevant_chunks}
     except Exception as e:
         return {"error": str(e)}
 
 
+class QueryPair(BaseModel):
+    url: str
+    query: str
+
+
+class BatchQueryRequest(BaseModel):
+    items: list[QueryPair]
+    top_k: int = 5
+    # add each chunk's cosine similarity to its query; every query is encoded by the same model,
+    # so chunks of different pages can be merged into one ranking
+    with_scores: bool = False
+
+
+@app.post("/query/batch")
+async def query_wiki_batch(request: BatchQueryRequest) -> dict[str, Union[list[dict], str]]:
+    try:
+        urls = list(dict.fromkeys(item.url for item in request.items))
+        queries = list(dict.fromkeys(item.query for item in request.items))
+        pages = await load_pages_chunks(urls)
+        # every distinct query is encoded once, in a single batch
+        query_embeddings = await embedding_batcher.aencode(queries)
+        query_index = {query: i for i, query in enumerate(queries)}
+
+        results = []
+        for item in request.items:
+            page = pages[item.url]
+            if isinstance(page, Exception):
+                results.append({"url": item.url, "query": item.query, "error": str(page)})
+                continue
+            _, chunks, chunk_embeddings = page
+            scored = score_chunks(
+                chunks, chunk_embeddings, query_embeddings[query_index[item.query]], top_k=request.top_k
+            )
+            results.append(
+                {"url": item.url, "query": item.query, **scored_chunks_response(scored, request.with_scores)}
+            )
+        return {"results": results}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+class SearchRequest(BaseModel):
+    query: str
+    # restrict the search to these pages (fetched and indexed if needed); None searches every indexed page
+    urls: Union[list[str], None] = None
+    top_k: int = 5
+
+
+@app.post("/search")
+async def search_pages(request: SearchRequest) -> dict:
+    try:
+        errors = {}
+        if request.urls:
+            missing = [url for url in dict.fromkeys(request.urls) if url not in vector_index]
+            if missing:
+                pages = await load_pages_chunks(missing)
+                errors = {url: str(page) for url, page in pages.items() if isinstance(page, Exception)}
+        query_embedding = (await embedding_batcher.aencode([request.query]))[0]
+        results = await asyncio.to_thread(vector_index.search, query_embedding, request.urls, request.top_k)
+        response = {"results": results}
+        if errors:
+            response["errors"] = errors
+        return response
+    except Exception as e:
+        return {"error": str(e)}
+
+
+class AnswerLookupRequest(BaseModel):
+    question: str
+    language: str = "en"
+
+
+class AnswerRequest(AnswerLookupRequest):
+    answer: str
+    # pages the answer was based on
+    sources: list[str] = []
+
+
+@app.post("/answers/lookup")
+async def lookup_answer(request: AnswerLookupRequest) -> dict:
+    try:
+        question_embedding = (await embedding_batcher.aencode([request.question]))[0]
+        match = answer_cache.get(request.language, question_embedding)
+        if match is None:
+            return {"hit": False}
+        entry, similarity = match
+        return {"hit": True, "similarity": similarity, **entry}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@app.post("/answers")
+async def store_answer(request: AnswerRequest) -> dict[str, str]:
+    try:
+        question_embedding = (await embedding_batcher.aencode([request.question]))[0]
+        answer_cache.put(request.language, question_embedding, request.question, request.answer, request.sources)
+        return {"message": "Answer stored"}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+async def prefetch_page(url: str) -> None:
+    async with prefetch_slots:
+        prefetch_running.add(url)
+        try:
+            result = (await load_pages_chunks([url], wait=False))[url]
+        finally:
+            prefetch_running.discard(url)
+    if isinstance(result, Exception):
+        raise result
+
+
+def prefetch_done(url: str, job: asyncio.Task) -> None:
+    if prefetch_jobs.get(url) is job:
+        del prefetch_jobs[url]
+    if job.cancelled():
+        return
+    if job.exception() is not None:
+        prefetch_stats["failed"] += 1
+    else:
+        prefetch_stats["completed"] += 1
+
+
+def start_prefetch(urls: list[str]) -> None:
+    for url in urls:
+        if url in prefetch_jobs or url in vector_index:
+            prefetch_stats["skipped"] += 1
+            continue
+        job = asyncio.create_task(prefetch_page(url))
+        job.add_done_callback(functools.partial(prefetch_done, url))
+        prefetch_jobs[url] = job
+        prefetch_stats["started"] += 1
+
+
+async def fetch_search_results(key: str, query: str, language: str, top_k: int) -> list[str]:
+    page_urls = await asearch_for_wikipedia_page_url(query, http_client, language=language, top_k=top_k) or []
+    await asyncio.to_thread(search_cache.put, key, page_urls)
+    return page_urls
+
+
+def refresh_search_results(key: str, query: str, language: str, top_k: int) -> None:
+    if key in search_flights:
+        return
+    task = asyncio.create_task(
+        search_flights.do(key, functools.partial(fetch_search_results, key, query, language, top_k))
+    )
+    # keep a reference until the refresh finishes; a failed refresh leaves the stale entry in place
+    search_refreshes.add(task)
+    task.add_done_callback(search_refresh_done)
+
+
+def search_refresh_done(task: asyncio.Task) -> None:
+    search_refreshes.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Error refreshing search results: {task.exception()}")
+
+
+async def search_wikipedia(query: str, language: str = "en", top_k: int = 3) -> list[str]:
+    key = SearchCache.make_key(language, query, top_k)
+    cached = await asyncio.to_thread(search_cache.get, key)
+    if cached is not None:
+        page_urls, fresh = cached
+        if not fresh:
+            refresh_search_results(key, query, language, top_k)
+        return page_urls
+    return await search_flights.do(key, functools.partial(fetch_search_results, key, query, language, top_k))
+
+
 @app.get("/explore")
-def explore_relevant_wiki_pages(query: str, language: str = "en") -> dict[str, Union[list[str] | str, None]]:
+async def explore_relevant_wiki_pages(
+    query: str, language: str = "en", prefetch: bool = False
+) -> dict[str, Union[list[str] | str, None]]:
+    # prefetch: fetch, chunk and embed the returned pages in the background, since a /query usually follows
     try:
-        page_urls = search_for_wikipedia_page_url(query, language=language)
-        if page_urls is None:
-            return {"page_urls": []}
+        page_urls = await search_wikipedia(query, language=language)
+        if prefetch:
+            start_prefetch(page_urls)
         return {"page_urls": page_urls}
     except Exception as e:
         return {"error": str(e)}
@@ -74,112 +504,151 @@ def explore_relevant_wiki_pages(query: str, language: str = "en") -> dict[str, U
 
 # Session & Folder Management Endpoints
 
+@app.get("/sidebar")
+def get_sidebar(request: Request, limit: int = Query(200, ge=1)):
+    # folders and the newest session summaries in one round trip; the ETag is a hash of the body,
+    # so a client whose sidebar has not changed gets an empty 304
+    sessions, next_cursor = store.list_sessions_page(limit)
+    content = {
+        "folders": store.list_folders(),
+        "sessions": sessions,
+        "has_more": next_cursor is not None,
+        "next_cursor": next_cursor,
+    }
+    body = json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 @app.get("/folders")
 def get_folders() -> dict[str, list[dict]]:
-    global db
-    db = load_data()
-    folders_list = []
-    for folder_id, folder_data in db.get("folders", {}).items():
-        folders_list.append({
-            "id": folder_id,
-            "name": folder_data.get("name", "New Folder"),
-            "created_at": folder_data.get("created_at", "")
-        })
-    folders_list.sort(key=lambda x: x["created_at"])
-    return {"folders": folders_list}
+    return {"folders": store.list_folders()}
 
 @app.post("/folders")
 def create_folder(name: str) -> dict[str, str]:
-    global db
-    folder_id = str(uuid.uuid4())
-    db.setdefault("folders", {})[folder_id] = {
-        "name": name,
-        "created_at": datetime.now().isoformat()
-    }
-    save_data(db)
+    folder_id = store.create_folder(name)
     return {"folder_id": folder_id, "name": name}
 
 @app.delete("/folders/{folder_id}")
 def delete_folder(folder_id: str) -> dict:
-    global db
-    if folder_id in db.get("folders", {}):
-        # Move sessions in this folder to root (None)
-        for session in db.get("sessions", {}).values():
-            if session.get("folder_id") == folder_id:
-                session["folder_id"] = None
-        del db["folders"][folder_id]
-        save_data(db)
+    store.delete_folder(folder_id)
     return {"message": "Folder deleted"}
 
 @app.get("/sessions")
-def get_sessions() -> dict[str, list[dict]]:
-    global db
-    db = load_data() # Reload to ensure freshness
-    sessions_list = []
-    for session_id, session_data in db.get("sessions", {}).items():
-        sessions_list.append({
-            "id": session_id,
-            "title": session_data.get("title", "New Chat"),
-            "folder_id": session_data.get("folder_id"),
-            "created_at": session_data.get("created_at", "")
-        })
-    # Sort by created_at desc
-    sessions_list.sort(key=lambda x: x["created_at"], reverse=True)
-    return {"sessions": sessions_list}
+def get_sessions(
+    limit: Union[int, None] = Query(None, ge=1),
+    cursor: Union[str, None] = None,
+    folder_id: Union[str, None] = None,
+) -> dict:
+    # newest first; pass next_cursor back as cursor for the following page. Without folder_id every
+    # session is listed, and an empty folder_id lists the uncategorized ones
+    if folder_id is None:
+        folder_filter = ALL_FOLDERS
+    else:
+        folder_filter = folder_id or None
+    try:
+        sessions, next_cursor = store.list_sessions_page(limit, cursor, folder_filter)
+    except ValueError as e:
+        return {"error": str(e)}
+    return {"sessions": sessions, "next_cursor": next_cursor}
 
 @app.post("/sessions")
 def create_session(title: str = "New Chat", folder_id: Union[str, None] = None) -> dict[str, str]:
-    global db
-    session_id = str(uuid.uuid4())
-    db.setdefault("sessions", {})[session_id] = {
-        "title": title,
-        "folder_id": folder_id,
-        "messages": [],
-        "created_at": datetime.now().isoformat()
-    }
-    save_data(db)
+    session_id = store.create_session(title, folder_id)
     return {"session_id": session_id, "title": title}
 
 @app.get("/sessions/{session_id}")
-def get_session(session_id: str) -> dict:
-    global db
-    db = load_data()
-    session = db.get("sessions", {}).get(session_id)
+def get_session(
+    session_id: str,
+    message_limit: Union[int, None] = Query(None, ge=0),
+    before: Union[int, None] = Query(None, ge=0),
+) -> dict:
+    # message_limit returns only the newest messages before position `before` (default: the end);
+    # messages_offset is the position of the first one returned, message_count the total
+    session = store.get_session(session_id, message_limit, before)
     if not session:
         return {"error": "Session not found"}
     return {"session": session}
 
 @app.put("/sessions/{session_id}")
 def update_session(session_id: str, messages: list[dict[str, str]]) -> dict:
-    global db
-    if session_id not in db.get("sessions", {}):
+    if not store.set_messages(session_id, messages):
         return {"error": "Session not found"}
-    db["sessions"][session_id]["messages"] = messages
-    save_data(db)
     return {"message": "Session updated"}
 
+class AppendMessagesRequest(BaseModel):
+    messages: list[dict[str, str]]
+    expected_version: Union[int, None] = None
+
+
+class EditMessageRequest(BaseModel):
+    content: str
+    role: Union[str, None] = None
+    expected_version: Union[int, None] = None
+
+
+def version_conflict_response(e: VersionConflict) -> JSONResponse:
+    return JSONResponse(status_code=409, content={"error": "Version conflict", "version": e.current_version})
+
+@app.post("/sessions/{session_id}/messages")
+def append_session_messages(session_id: str, request: AppendMessagesRequest):
+    try:
+        version = store.append_messages(session_id, request.messages, request.expected_version)
+    except VersionConflict as e:
+        return version_conflict_response(e)
+    if version is None:
+        return {"error": "Session not found"}
+    return {"message": "Messages appended", "version": version}
+
+@app.patch("/sessions/{session_id}/messages/{index}")
+def edit_session_message(session_id: str, index: int, request: EditMessageRequest):
+    message = {"content": request.content}
+    if request.role is not None:
+        message["role"] = request.role
+    try:
+        version = store.edit_message(session_id, index, message, request.expected_version)
+    except VersionConflict as e:
+        return version_conflict_response(e)
+    except IndexError:
+        return {"error": "Message not found"}
+    if version is None:
+        return {"error": "Session not found"}
+    return {"message": "Message updated", "version": version}
+
 @app.put("/sessions/{session_id}/title")
 def update_session_title(session_id: str, title: str) -> dict:
-    global db
-    if session_id not in db.get("sessions", {}):
+    if not store.set_title(session_id, title):
         return {"error": "Session not found"}
-    db["sessions"][session_id]["title"] = title
-    save_data(db)
     return {"message": "Title updated"}
 
+class SummaryRequest(BaseModel):
+    summary: str
+    # number of leading messages the summary covers
+    upto: int
+    # version of the session the summarized messages were read at; a stale summary gets a 409
+    expected_version: Union[int, None] = None
+
+
+@app.put("/sessions/{session_id}/summary")
+def update_session_summary(session_id: str, request: SummaryRequest):
+    try:
+        updated = store.set_summary(session_id, request.summary, request.upto, request.expected_version)
+    except VersionConflict as e:
+        return version_conflict_response(e)
+    if not updated:
+        return {"error": "Session not found"}
+    return {"message": "Summary updated"}
+
 @app.put("/sessions/{session_id}/folder")
 def update_session_folder(session_id: str, folder_id: Union[str, None]) -> dict:
-    global db
-    if session_id not in db.get("sessions", {}):
+    if not store.set_folder(session_id, folder_id):
         return {"error": "Session not found"}
-    db["sessions"][session_id]["folder_id"] = folder_id
-    save_data(db)
     return {"message": "Session folder updated"}
 
 @app.delete("/sessions/{session_id}")
 def delete_session(session_id: str) -> dict:
-    global db
-    if session_id in db.get("sessions", {}):
-        del db["sessions"][session_id]
-        save_data(db)
+    store.delete_session(session_id)
     return {"message": "Session deleted"}
@@ -0,0 +1,48 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Keyed registry of in-flight coroutines: concurrent calls with the same key share one run.
+
+    The first caller for a key starts the work as a task; callers arriving while it runs
+    await the same task (counted as coalesced). A caller being cancelled does not cancel
+    the shared task, and the key is released as soon as the task finishes.
+    """
+
+    def __init__(self):
+        self._tasks: dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._tasks
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        self.calls += 1
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # retrieve the exception here so it is not reported as unhandled when every caller was cancelled
+        if not task.cancelled() and task.exception() is not None:
+            self.failures += 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "in_flight": len(self._tasks),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "failures": self.failures,
+        }
@@ -0,0 +1,592 @@
+import base64
+import bisect
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Union
+
+
+class VersionConflict(Exception):
+    """Raised when a message write was based on an outdated version of the session."""
+
+    def __init__(self, current_version: int):
+        super().__init__(f"Session is at version {current_version}")
+        self.current_version = current_version
+
+
+# list_sessions_page(folder_id=ALL_FOLDERS) lists every session; folder_id=None lists uncategorized ones
+ALL_FOLDERS = object()
+
+
+def encode_cursor(created_at: str, session_id: str) -> str:
+    # opaque keyset cursor: the (created_at, id) of the last session on the previous page
+    return base64.urlsafe_b64encode(json.dumps([created_at, session_id]).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        created_at, session_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    return str(created_at), str(session_id)
+
+
+def check_page_limit(limit: Union[int, None]) -> None:
+    if limit is not None and limit < 1:
+        raise ValueError(f"limit must be at least 1, got {limit}")
+
+
+def message_window(message_count: int, message_limit: Union[int, None], before: Union[int, None]) -> tuple[int, int]:
+    """Positions [start, stop) of the newest ``message_limit`` messages before position ``before``."""
+    if (message_limit is not None and message_limit < 0) or (before is not None and before < 0):
+        raise ValueError("message_limit and before must not be negative")
+    stop = message_count if before is None else max(0, min(before, message_count))
+    start = 0 if message_limit is None else max(0, stop - message_limit)
+    return start, stop
+
+
+def load_json_history(path: str) -> dict:
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+                # Check if data is in the new format (dict with "sessions")
+                if isinstance(data, dict) and "sessions" in data:
+                    return data
+                # If it's a list (old format) or other invalid format, reset
+                print("Detected old or invalid data format. Resetting chat history.")
+                return {"sessions": {}}
+        except Exception as e:
+            print(f"Error loading data: {e}. Resetting chat history.")
+            return {"sessions": {}}
+    return {"sessions": {}}
+
+
+class JSONStore:
+    """Original storage: the whole history lives in one JSON file that is rewritten on every change."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._file_stamp = None
+        # (created_at, session id) of every session in ascending order, for paged listing without a sort
+        self._order: list[tuple[str, str]] = []
+        self.data = self.load_data()
+        if "folders" not in self.data:
+            self.data["folders"] = {}
+            self.save_data(self.data)
+        self._rebuild_order()
+
+    def load_data(self) -> dict:
+        return load_json_history(self.path)
+
+    def save_data(self, data: dict) -> None:
+        # write to a temp file and rename so a crash mid-write cannot corrupt the history
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+        self._file_stamp = self._stat()
+
+    def _stat(self) -> Union[tuple[int, int], None]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _reload(self) -> None:
+        # only re-read the file when another process has changed it since our last read or write
+        stamp = self._stat()
+        if stamp is not None and stamp == self._file_stamp:
+            return
+        self.data = self.load_data()
+        self.data.setdefault("folders", {})
+        self._file_stamp = stamp
+        self._rebuild_order()
+
+    def _rebuild_order(self) -> None:
+        self._order = sorted(
+            (session.get("created_at", ""), session_id) for session_id, session in self.data["sessions"].items()
+        )
+
+    def list_folders(self) -> list[dict]:
+        with self._lock:
+            self._reload()
+            folders_list = [
+                {
+                    "id": folder_id,
+                    "name": folder_data.get("name", "New Folder"),
+                    "created_at": folder_data.get("created_at", ""),
+                }
+                for folder_id, folder_data in self.data["folders"].items()
+            ]
+        folders_list.sort(key=lambda x: x["created_at"])
+        return folders_list
+
+    def create_folder(self, name: str) -> str:
+        with self._lock:
+            folder_id = str(uuid.uuid4())
+            self.data["folders"][folder_id] = {
+                "name": name,
+                "created_at": datetime.now().isoformat(),
+            }
+            self.save_data(self.data)
+        return folder_id
+
+    def delete_folder(self, folder_id: str) -> None:
+        with self._lock:
+            if folder_id not in self.data["folders"]:
+                return
+            # Move sessions in this folder to root (None)
+            for session in self.data["sessions"].values():
+                if session.get("folder_id") == folder_id:
+                    session["folder_id"] = None
+            del self.data["folders"][folder_id]
+            self.save_data(self.data)
+
+    def list_sessions_page(
+        self, limit: Union[int, None] = None, cursor: Union[str, None] = None, folder_id=ALL_FOLDERS
+    ) -> tuple[list[dict], Union[str, None]]:
+        """Sessions newest first, starting after ``cursor``; returns the page and the cursor of the next one."""
+        check_page_limit(limit)
+        after = decode_cursor(cursor) if cursor else None
+        with self._lock:
+            self._reload()
+            position = bisect.bisect_left(self._order, after) if after else len(self._order)
+            page = []
+            # walk the sorted index backwards from the cursor (one extra match tells whether a next page
+            # exists); a folder filter skips sessions of other folders
+            while position > 0 and (limit is None or len(page) <= limit):
+                position -= 1
+                created_at, session_id = self._order[position]
+                session = self.data["sessions"][session_id]
+                if folder_id is not ALL_FOLDERS and session.get("folder_id") != folder_id:
+                    continue
+                page.append({
+                    "id": session_id,
+                    "title": session.get("title", "New Chat"),
+                    "folder_id": session.get("folder_id"),
+                    "created_at": created_at,
+                })
+        if limit is None or len(page) <= limit:
+            return page, None
+        page = page[:limit]
+        return page, encode_cursor(page[-1]["created_at"], page[-1]["id"])
+
+    def create_session(self, title: str, folder_id: Union[str, None]) -> str:
+        with self._lock:
+            session_id = str(uuid.uuid4())
+            created_at = datetime.now().isoformat()
+            self.data["sessions"][session_id] = {
+                "title": title,
+                "folder_id": folder_id,
+                "messages": [],
+                "created_at": created_at,
+            }
+            self.save_data(self.data)
+            bisect.insort(self._order, (created_at, session_id))
+        return session_id
+
+    def get_session(
+        self, session_id: str, message_limit: Union[int, None] = None, before: Union[int, None] = None
+    ) -> Union[dict, None]:
+        with self._lock:
+            self._reload()
+            session = self.data["sessions"].get(session_id)
+        if session is None:
+            return None
+        messages = session.get("messages", [])
+        start, stop = message_window(len(messages), message_limit, before)
+        return {
+            **session,
+            "messages": messages[start:stop],
+            "messages_offset": start,
+            "message_count": len(messages),
+            "version": session.get("version", 0),
+            "summary": session.get("summary", ""),
+            "summary_upto": session.get("summary_upto", 0),
+        }
+
+    def _update_session(self, session_id: str, **fields) -> bool:
+        with self._lock:
+            session = self.data["sessions"].get(session_id)
+            if session is None:
+                return False
+            session.update(fields)
+            self.save_data(self.data)
+        return True
+
+    def set_messages(self, session_id: str, messages: list[dict[str, str]]) -> bool:
+        with self._lock:
+            session = self.data["sessions"].get(session_id)
+            version = session.get("version", 0) + 1 if session is not None else 0
+            return self._update_session(session_id, messages=messages, version=version, summary="", summary_upto=0)
+
+    def _check_version(self, session: dict, expected_version: Union[int, None]) -> int:
+        version = session.get("version", 0)
+        if expected_version is not None and expected_version != version:
+            raise VersionConflict(version)
+        return version
+
+    def append_messages(
+        self, session_id: str, messages: list[dict[str, str]], expected_version: Union[int, None] = None
+    ) -> Union[int, None]:
+        with self._lock:
+            session = self.data["sessions"].get(session_id)
+            if session is None:
+                return None
+            version = self._check_version(session, expected_version) + 1
+            session.setdefault("messages", []).extend(messages)
+            session["version"] = version
+            self.save_data(self.data)
+        return version
+
+    def edit_message(
+        self, session_id: str, index: int, message: dict[str, str], expected_version: Union[int, None] = None
+    ) -> Union[int, None]:
+        with self._lock:
+            session = self.data["sessions"].get(session_id)
+            if session is None:
+                return None
+            version = self._check_version(session, expected_version) + 1
+            messages = session.get("messages", [])
+            if not 0 <= index < len(messages):
+                raise IndexError(index)
+            messages[index] = {**messages[index], **message}
+            session["version"] = version
+            # an edit inside the summarized range makes the summary stale
+            if session.get("summary_upto", 0) > index:
+                session["summary"], session["summary_upto"] = "", 0
+            self.save_data(self.data)
+        return version
+
+    def set_title(self, session_id: str, title: str) -> bool:
+        return self._update_session(session_id, title=title)
+
+    def set_summary(
+        self, session_id: str, summary: str, upto: int, expected_version: Union[int, None] = None
+    ) -> bool:
+        with self._lock:
+            session = self.data["sessions"].get(session_id)
+            if session is None:
+                return False
+            # summaries are written in the background; one based on an older version of the messages is stale
+            self._check_version(session, expected_version)
+            session["summary"], session["summary_upto"] = summary, upto
+            self.save_data(self.data)
+        return True
+
+    def set_folder(self, session_id: str, folder_id: Union[str, None]) -> bool:
+        return self._update_session(session_id, folder_id=folder_id)
+
+    def delete_session(self, session_id: str) -> None:
+        with self._lock:
+            if session_id in self.data["sessions"]:
+                created_at = self.data["sessions"].pop(session_id).get("created_at", "")
+                self.save_data(self.data)
+                position = bisect.bisect_left(self._order, (created_at, session_id))
+                if position < len(self._order) and self._order[position] == (created_at, session_id):
+                    del self._order[position]
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS folders (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_folders_created_at ON folders (created_at);
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    folder_id TEXT,
+    created_at TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    -- rolling summary of messages [0, summary_upto), maintained by the frontend
+    summary TEXT NOT NULL DEFAULT '',
+    summary_upto INTEGER NOT NULL DEFAULT 0
+);
+DROP INDEX IF EXISTS idx_sessions_created_at;
+DROP INDEX IF EXISTS idx_sessions_folder_created_at;
+-- keyset pagination walks these backwards: ORDER BY created_at DESC, id DESC
+CREATE INDEX IF NOT EXISTS idx_sessions_created_id ON sessions (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_sessions_folder_created_id ON sessions (folder_id, created_at, id);
+CREATE TABLE IF NOT EXISTS messages (
+    session_id TEXT NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (session_id, position)
+) WITHOUT ROWID;
+"""
+
+
+class SQLiteStore:
+    """SQLite (WAL mode) storage with per-row updates and indexed session listing."""
+
+    def __init__(self, path: str, legacy_json_path: Union[str, None] = None):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        # databases created before message versioning or summaries lack those columns
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(sessions)")}
+        if "version" not in columns:
+            conn.execute("ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        if "summary" not in columns:
+            conn.execute("ALTER TABLE sessions ADD COLUMN summary TEXT NOT NULL DEFAULT ''")
+            conn.execute("ALTER TABLE sessions ADD COLUMN summary_upto INTEGER NOT NULL DEFAULT 0")
+        if legacy_json_path:
+            self._migrate_from_json(legacy_json_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        # one connection per worker thread; WAL lets readers run alongside a writer
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _migrate_from_json(self, json_path: str) -> None:
+        # One-shot import of the old chat_history.json; the file itself is left untouched
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+                return
+            if os.path.exists(json_path):
+                data = load_json_history(json_path)
+                for folder_id, folder in data.get("folders", {}).items():
+                    conn.execute(
+                        "INSERT OR IGNORE INTO folders (id, name, created_at) VALUES (?, ?, ?)",
+                        (folder_id, folder.get("name", "New Folder"), folder.get("created_at", "")),
+                    )
+                for session_id, session in data.get("sessions", {}).items():
+                    conn.execute(
+                        "INSERT OR IGNORE INTO sessions (id, title, folder_id, created_at) VALUES (?, ?, ?, ?)",
+                        (
+                            session_id,
+                            session.get("title", "New Chat"),
+                            session.get("folder_id"),
+                            session.get("created_at", ""),
+                        ),
+                    )
+                    self._insert_messages(conn, session_id, session.get("messages", []), 0)
+                print(f"Migrated {len(data.get('sessions', {}))} sessions from {json_path}")
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (datetime.now().isoformat(),))
+
+    @staticmethod
+    def _insert_messages(conn: sqlite3.Connection, session_id: str, messages: list[dict[str, str]], start: int) -> None:
+        conn.executemany(
+            "INSERT INTO messages (session_id, position, role, content) VALUES (?, ?, ?, ?)",
+            [
+                (session_id, start + i, message.get("role", ""), message.get("content", ""))
+                for i, message in enumerate(messages)
+            ],
+        )
+
+    def list_folders(self) -> list[dict]:
+        rows = self._connect().execute(
+            "SELECT id, name, created_at FROM folders ORDER BY created_at"
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def create_folder(self, name: str) -> str:
+        folder_id = str(uuid.uuid4())
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO folders (id, name, created_at) VALUES (?, ?, ?)",
+                (folder_id, name, datetime.now().isoformat()),
+            )
+        return folder_id
+
+    def delete_folder(self, folder_id: str) -> None:
+        with self._transaction() as conn:
+            # Move sessions in this folder to root (None)
+            conn.execute("UPDATE sessions SET folder_id = NULL WHERE folder_id = ?", (folder_id,))
+            conn.execute("DELETE FROM folders WHERE id = ?", (folder_id,))
+
+    def list_sessions_page(
+        self, limit: Union[int, None] = None, cursor: Union[str, None] = None, folder_id=ALL_FOLDERS
+    ) -> tuple[list[dict], Union[str, None]]:
+        """Sessions newest first, starting after ``cursor``; returns the page and the cursor of the next one."""
+        check_page_limit(limit)
+        conditions, params = [], []
+        if folder_id is None:
+            conditions.append("folder_id IS NULL")
+        elif folder_id is not ALL_FOLDERS:
+            conditions.append("folder_id = ?")
+            params.append(folder_id)
+        if cursor:
+            conditions.append("(created_at, id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        # fetch one extra row to learn whether another page follows
+        limit_clause = "LIMIT ?" if limit is not None else ""
+        if limit is not None:
+            params.append(limit + 1)
+        rows = self._connect().execute(
+            f"SELECT id, title, folder_id, created_at FROM sessions {where} "
+            f"ORDER BY created_at DESC, id DESC {limit_clause}",
+            params,
+        ).fetchall()
+        page = [dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            next_cursor = encode_cursor(page[-1]["created_at"], page[-1]["id"])
+        return page, next_cursor
+
+    def create_session(self, title: str, folder_id: Union[str, None]) -> str:
+        session_id = str(uuid.uuid4())
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO sessions (id, title, folder_id, created_at) VALUES (?, ?, ?, ?)",
+                (session_id, title, folder_id, datetime.now().isoformat()),
+            )
+        return session_id
+
+    def get_session(
+        self, session_id: str, message_limit: Union[int, None] = None, before: Union[int, None] = None
+    ) -> Union[dict, None]:
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT title, folder_id, created_at, version, summary, summary_upto FROM sessions WHERE id = ?",
+            (session_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        # positions are contiguous from 0, so the count is one past the highest (a primary key lookup)
+        message_count = conn.execute(
+            "SELECT COALESCE(MAX(position) + 1, 0) FROM messages WHERE session_id = ?", (session_id,)
+        ).fetchone()[0]
+        start, stop = message_window(message_count, message_limit, before)
+        messages = conn.execute(
+            "SELECT role, content FROM messages WHERE session_id = ? AND position >= ? AND position < ? "
+            "ORDER BY position",
+            (session_id, start, stop),
+        ).fetchall()
+        return {
+            **dict(row),
+            "messages": [dict(message) for message in messages],
+            "messages_offset": start,
+            "message_count": message_count,
+        }
+
+    def set_messages(self, session_id: str, messages: list[dict[str, str]]) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE sessions SET version = version + 1, summary = '', summary_upto = 0 WHERE id = ?",
+                (session_id,),
+            )
+            if cursor.rowcount == 0:
+                return False
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._insert_messages(conn, session_id, messages, 0)
+        return True
+
+    @staticmethod
+    def _bump_version(conn: sqlite3.Connection, session_id: str, expected_version: Union[int, None]) -> Union[int, None]:
+        row = conn.execute("SELECT version FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        if expected_version is not None and expected_version != row["version"]:
+            raise VersionConflict(row["version"])
+        conn.execute("UPDATE sessions SET version = ? WHERE id = ?", (row["version"] + 1, session_id))
+        return row["version"] + 1
+
+    def append_messages(
+        self, session_id: str, messages: list[dict[str, str]], expected_version: Union[int, None] = None
+    ) -> Union[int, None]:
+        with self._transaction() as conn:
+            version = self._bump_version(conn, session_id, expected_version)
+            if version is None:
+                return None
+            start = conn.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+            self._insert_messages(conn, session_id, messages, start)
+        return version
+
+    def edit_message(
+        self, session_id: str, index: int, message: dict[str, str], expected_version: Union[int, None] = None
+    ) -> Union[int, None]:
+        with self._transaction() as conn:
+            version = self._bump_version(conn, session_id, expected_version)
+            if version is None:
+                return None
+            row = conn.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? AND position = ?", (session_id, index)
+            ).fetchone()
+            if row is None:
+                raise IndexError(index)
+            updated = {**dict(row), **message}
+            conn.execute(
+                "UPDATE messages SET role = ?, content = ? WHERE session_id = ? AND position = ?",
+                (updated["role"], updated["content"], session_id, index),
+            )
+            # an edit inside the summarized range makes the summary stale
+            conn.execute(
+                "UPDATE sessions SET summary = '', summary_upto = 0 WHERE id = ? AND summary_upto > ?",
+                (session_id, index),
+            )
+        return version
+
+    def _update_session(self, session_id: str, column: str, value: Union[str, None]) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute(f"UPDATE sessions SET {column} = ? WHERE id = ?", (value, session_id))
+        return cursor.rowcount > 0
+
+    def set_title(self, session_id: str, title: str) -> bool:
+        return self._update_session(session_id, "title", title)
+
+    def set_summary(
+        self, session_id: str, summary: str, upto: int, expected_version: Union[int, None] = None
+    ) -> bool:
+        with self._transaction() as conn:
+            row = conn.execute("SELECT version FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                return False
+            # summaries are written in the background; one based on an older version of the messages is stale
+            if expected_version is not None and expected_version != row["version"]:
+                raise VersionConflict(row["version"])
+            conn.execute(
+                "UPDATE sessions SET summary = ?, summary_upto = ? WHERE id = ?", (summary, upto, session_id)
+            )
+        return True
+
+    def set_folder(self, session_id: str, folder_id: Union[str, None]) -> bool:
+        return self._update_session(session_id, "folder_id", folder_id)
+
+    def delete_session(self, session_id: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+
+def open_store(backend: str, sqlite_path: str, json_path: str) -> Union[JSONStore, SQLiteStore]:
+    if backend == "json":
+        return JSONStore(json_path)
+    if backend == "sqlite":
+        return SQLiteStore(sqlite_path, legacy_json_path=json_path)
+    raise ValueError(f"Unknown storage backend: {backend}")
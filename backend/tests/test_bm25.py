@@ -0,0 +1,22 @@
+import pytest
+
+from bm25 import BM25Index
+
+CHUNKS = [
+    "Taipei 101 is a skyscraper in Taipei.",
+    "The tower was the tallest building in the world.",
+    "Yushan is the highest mountain in Taiwan.",
+]
+
+
+def test_top_n_returns_matching_chunks_best_first():
+    index = BM25Index(CHUNKS)
+    assert index.top_n("Taipei skyscraper", 5) == [0]
+    assert index.top_n("tallest mountain", 1) in ([1], [2])
+    assert index.top_n("volcano", 5) == []
+
+
+@pytest.mark.parametrize("n", [0, -1])
+def test_top_n_rejects_non_positive_n(n):
+    with pytest.raises(ValueError):
+        BM25Index(CHUNKS).top_n("Taipei", n)
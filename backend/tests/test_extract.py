@@ -0,0 +1,65 @@
+import pytest
+
+from extract import HTML_EXTRACTORS, extract_html_bs4
+
+INDICATOR_PAGE = b"""<html><head><script>RLCONF={"wgRevisionId":1234};</script></head><body>
+<div class="mw-indicators">
+  <div id="mw-indicator-pp-default" class="mw-indicator"><div class="mw-parser-output"><span typeof="mw:File">
+    <a href="/wiki/Wikipedia:Protection_policy" title="Protected"><img alt="Page semi-protected"></a>
+  </span></div></div>
+</div>
+<div id="mw-content-text" class="mw-body-content"><div class="mw-content-ltr mw-parser-output" lang="en">
+  <p>The tower is a landmark.</p>
+  <h2 id="History">History<span class="mw-editsection">[edit]</span></h2>
+  <p>It was built in 1889.</p>
+</div></div>
+</body></html>"""
+
+ARTICLE_PAGE = """<html><head><script>RLCONF={"wgRevisionId":98765};</script></head><body>
+<div class="mw-indicators"><div class="mw-indicator"><div class="mw-parser-output"><p>Featured article</p></div></div></div>
+<div id="mw-content-text"><div class="mw-content-ltr mw-parser-output">
+  <style data-mw-deduplicate="TemplateStyles:r1">.mw-parser-output .frac{white-space:nowrap}</style>
+  <p>Height is <span class="frac">3<style>.mw-parser-output .sfrac{display:inline-block}</style>1/2</span> m.</p>
+  <p><script>mw.loader.load("ext.gadget");</script>Tokyo Tower (東京タワー) is a tower.</p>
+  <p>   </p>
+  <h2><span class="mw-headline">History</span><span class="mw-editsection">[<a href="#">edit</a>]</span></h2>
+  <p>Built in <b>1958</b>.</p>
+  <h3>Design</h3>
+  <p>Painted <i>international orange</i>.</p>
+</div></div>
+</body></html>""".encode("utf-8")
+
+ARTICLE_TEXT = (
+    "Height is 31/2 m.\n"
+    "Tokyo Tower (東京タワー) is a tower.\n"
+    "## History\n"
+    "Built in 1958.\n"
+    "### Design\n"
+    "Painted international orange."
+)
+
+
+def test_extract_skips_page_indicators():
+    page = extract_html_bs4(INDICATOR_PAGE)
+    assert page.text == "The tower is a landmark.\n## History\nIt was built in 1889."
+    assert page.revision == "1234"
+
+
+def test_extract_without_content_text_uses_parser_output():
+    page = extract_html_bs4(b'<div class="mw-parser-output"><p>Fragment text.</p></div>')
+    assert page.text == "Fragment text."
+
+
+@pytest.mark.parametrize("name", sorted(HTML_EXTRACTORS))
+def test_html_extractors_share_the_text_contract(name):
+    page = HTML_EXTRACTORS[name](ARTICLE_PAGE)
+    assert page.text == ARTICLE_TEXT
+    assert page.revision == "98765"
+
+
+def test_html_extractors_agree():
+    outputs = {name: extractor(ARTICLE_PAGE) for name, extractor in HTML_EXTRACTORS.items()}
+    assert len(outputs) > 1, "lxml extractor is not available"
+    assert len(set(outputs.values())) == 1, outputs
+    outputs = {name: extractor(INDICATOR_PAGE) for name, extractor in HTML_EXTRACTORS.items()}
+    assert len(set(outputs.values())) == 1, outputs
@@ -0,0 +1,59 @@
+import numpy as np
+
+from index import VectorIndex
+
+DIM = 4
+
+
+def page(count, seed):
+    embeddings = np.random.default_rng(seed).normal(size=(count, DIM)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return [f"chunk {seed}-{i}" for i in range(count)], embeddings
+
+
+def page_bytes(chunks):
+    return len(chunks) * (DIM * 4 + 9) + sum(len(chunk.encode("utf-8")) for chunk in chunks)
+
+
+def test_search_returns_best_chunks_of_the_requested_pages():
+    index = VectorIndex(max_bytes=1024 * 1024)
+    for i, url in enumerate(["a", "b"]):
+        index.add_page(url, f"{url}-1", *page(3, i))
+    _, embeddings = page(3, 1)
+    results = index.search(embeddings[2], urls=["b"], top_k=2)
+    assert [(result["url"], result["offset"]) for result in results][0] == ("b", 2)
+    assert {result["url"] for result in results} == {"b"}
+    assert index.search(embeddings[2], urls=["missing"]) == []
+
+
+def test_oldest_pages_are_dropped_to_stay_within_max_bytes():
+    chunks, _ = page(10, 0)
+    index = VectorIndex(max_bytes=3 * page_bytes(chunks), initial_capacity=4)
+    for i in range(5):
+        index.add_page(f"page{i}", f"page{i}-1", *page(10, i))
+        stats = index.stats()
+        assert stats["bytes"] <= index.max_bytes
+        assert stats["allocated_bytes"] <= index.max_bytes
+    assert "page0" not in index and "page1" not in index
+    assert all(f"page{i}" in index for i in range(2, 5))
+    assert index.stats()["pages"] == 3
+
+
+def test_reindexing_a_page_replaces_its_rows():
+    index = VectorIndex(max_bytes=1024 * 1024)
+    index.add_page("a", "a-1", *page(4, 0))
+    chunks, embeddings = page(2, 1)
+    index.add_page("a", "a-2", chunks, embeddings)
+    stats = index.stats()
+    assert stats["rows"] == 2
+    assert stats["bytes"] == page_bytes(chunks)
+    assert index.search(embeddings[0], top_k=1)[0]["chunk"] == chunks[0]
+
+
+def test_a_page_larger_than_the_budget_is_still_indexed():
+    chunks, embeddings = page(10, 0)
+    index = VectorIndex(max_bytes=page_bytes(chunks) // 2)
+    index.add_page("a", "a-1", *page(3, 1))
+    index.add_page("big", "big-1", chunks, embeddings)
+    assert "big" in index and "a" not in index
+    assert index.search(embeddings[5], top_k=1)[0]["offset"] == 5
@@ -0,0 +1,129 @@
+import pytest
+
+from storage import ALL_FOLDERS, JSONStore, SQLiteStore, VersionConflict
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "json":
+        return JSONStore(str(tmp_path / "chat_history.json"))
+    return SQLiteStore(str(tmp_path / "chat_history.db"))
+
+
+def create_sessions(store, count, folder_id=None):
+    return [store.create_session(f"Chat {i}", folder_id) for i in range(count)]
+
+
+def test_list_sessions_page_follows_cursor_newest_first(store):
+    session_ids = create_sessions(store, 5)
+    pages, cursor = [], None
+    while True:
+        page, cursor = store.list_sessions_page(2, cursor)
+        pages.append([session["id"] for session in page])
+        if cursor is None:
+            break
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [session_id for page in pages for session_id in page] == session_ids[::-1]
+
+
+def test_list_sessions_page_without_limit_returns_everything(store):
+    session_ids = create_sessions(store, 3)
+    page, cursor = store.list_sessions_page()
+    assert [session["id"] for session in page] == session_ids[::-1]
+    assert cursor is None
+
+
+def test_list_sessions_page_exact_fit_has_no_next_page(store):
+    create_sessions(store, 2)
+    page, cursor = store.list_sessions_page(2)
+    assert len(page) == 2
+    assert cursor is None
+
+
+def test_list_sessions_page_filters_by_folder(store):
+    folder_id = store.create_folder("Work")
+    in_folder = create_sessions(store, 2, folder_id)
+    uncategorized = create_sessions(store, 1)
+    page, _ = store.list_sessions_page(10, folder_id=folder_id)
+    assert [session["id"] for session in page] == in_folder[::-1]
+    page, _ = store.list_sessions_page(10, folder_id=None)
+    assert [session["id"] for session in page] == uncategorized
+    page, _ = store.list_sessions_page(10, folder_id=ALL_FOLDERS)
+    assert len(page) == 3
+
+
+@pytest.mark.parametrize("limit", [0, -3])
+def test_list_sessions_page_rejects_non_positive_limit(store, limit):
+    create_sessions(store, 2)
+    with pytest.raises(ValueError):
+        store.list_sessions_page(limit)
+
+
+def test_list_sessions_page_rejects_invalid_cursor(store):
+    with pytest.raises(ValueError):
+        store.list_sessions_page(2, "not a cursor")
+
+
+def test_get_session_returns_message_window(store):
+    (session_id,) = create_sessions(store, 1)
+    store.append_messages(session_id, [{"role": "user", "content": str(i)} for i in range(10)])
+    session = store.get_session(session_id, message_limit=3)
+    assert [m["content"] for m in session["messages"]] == ["7", "8", "9"]
+    assert session["messages_offset"] == 7
+    assert session["message_count"] == 10
+    session = store.get_session(session_id, message_limit=3, before=2)
+    assert [m["content"] for m in session["messages"]] == ["0", "1"]
+    assert session["messages_offset"] == 0
+    assert store.get_session(session_id, message_limit=0)["messages"] == []
+
+
+@pytest.mark.parametrize("message_limit, before", [(-1, None), (None, -1)])
+def test_get_session_rejects_negative_window(store, message_limit, before):
+    (session_id,) = create_sessions(store, 1)
+    with pytest.raises(ValueError):
+        store.get_session(session_id, message_limit=message_limit, before=before)
+
+
+def test_append_messages_checks_version(store):
+    (session_id,) = create_sessions(store, 1)
+    assert store.append_messages(session_id, [{"role": "user", "content": "hi"}], expected_version=0) == 1
+    with pytest.raises(VersionConflict) as conflict:
+        store.append_messages(session_id, [{"role": "user", "content": "again"}], expected_version=0)
+    assert conflict.value.current_version == 1
+    assert store.get_session(session_id)["message_count"] == 1
+
+
+def test_edit_message_out_of_range(store):
+    (session_id,) = create_sessions(store, 1)
+    store.append_messages(session_id, [{"role": "user", "content": "hi"}])
+    with pytest.raises(IndexError):
+        store.edit_message(session_id, 1, {"content": "edited"})
+    assert store.get_session(session_id)["messages"][0]["content"] == "hi"
+
+
+def test_edit_message_inside_summary_resets_it(store):
+    (session_id,) = create_sessions(store, 1)
+    store.append_messages(session_id, [{"role": "user", "content": str(i)} for i in range(4)])
+    store.set_summary(session_id, "summary", 2)
+    store.edit_message(session_id, 3, {"content": "edited"})
+    assert store.get_session(session_id)["summary_upto"] == 2
+    store.edit_message(session_id, 1, {"content": "edited"})
+    session = store.get_session(session_id)
+    assert (session["summary"], session["summary_upto"]) == ("", 0)
+
+
+def test_missing_session(store):
+    assert store.get_session("missing") is None
+    assert store.append_messages("missing", []) is None
+
+
+def test_set_summary_rejects_stale_version(store):
+    (session_id,) = create_sessions(store, 1)
+    version = store.append_messages(session_id, [{"role": "user", "content": str(i)} for i in range(4)])
+    store.edit_message(session_id, 0, {"content": "edited"})
+    with pytest.raises(VersionConflict):
+        store.set_summary(session_id, "summary of the old text", 2, expected_version=version)
+    assert store.get_session(session_id)["summary_upto"] == 0
+    assert store.set_summary(session_id, "summary", 2, expected_version=version + 1)
+    assert store.get_session(session_id)["summary"] == "summary"
+    assert not store.set_summary("missing", "summary", 2)
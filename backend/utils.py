@@ -1,53 +1,176 @@
+import asyncio
+import math
+import re
+
+import httpx
+import numpy as np
 import requests
-from bs4 import BeautifulSoup
 from sentence_transformers import SentenceTransformer, util
-from typing import Union
+from typing import Callable, Iterator, NamedTuple, Union
+
+from bm25 import CJK_PATTERN, CJK_RANGES, BM25Index, reciprocal_rank_fusion
+from cache import PageCache
+from config import HTML_EXTRACTOR, PAGE_CACHE_DIR, PAGE_CACHE_DISK_MAX_BYTES, PAGE_CACHE_TTL, PAGE_SOURCE
+from extract import extract_api_json, get_html_extractor, is_wiki_api_url, wiki_api_url
+
+
+# bumped whenever the extracted page text changes shape, so cached pages are re-extracted
+TEXT_FORMAT = 3
+HEADING_PATTERN = re.compile(r"^(#{2,3}) (.+)$")
+# sentence ends: ASCII terminators followed by whitespace, or CJK full-width terminators
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|(?<=[。！？])")
+
+# One pooled session for all page fetches, so connections to Wikipedia are kept alive
+_session = requests.Session()
+_adapter = requests.adapters.HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=3)
+_session.mount("https://", _adapter)
+_session.mount("http://", _adapter)
+
+page_cache = PageCache(PAGE_CACHE_DIR or None, PAGE_CACHE_TTL, PAGE_CACHE_DISK_MAX_BYTES)
+html_extractor = get_html_extractor(HTML_EXTRACTOR)
+
+
+def create_async_http_client(max_connections: int = 20) -> httpx.AsyncClient:
+    # keep-alive, HTTP/2 client shared by the async endpoints; connection errors are retried like _session
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        retries=3,
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+    )
+    return httpx.AsyncClient(transport=transport, follow_redirects=True, timeout=10)
+
+
+class WikiPage(NamedTuple):
+    text: str
+    revision: str
 
 
 def get_wiki_text_from_url(url: str) -> str:
+    return get_wiki_page(url).text
+
 
+def _fetch(url: str, headers: dict[str, str]) -> requests.Response:
     try:
-        session = requests.Session()
-        adapter = requests.adapters.HTTPAdapter(max_retries=3)
-        session.mount("https://", adapter)
-        session.mount("http://", adapter)
-        response = session.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=10)
+        response = _session.get(url, headers=headers, timeout=10)
     except requests.RequestException as e:
         raise ValueError(f"Failed to retrieve content from URL: {url}. Error: {e}")
+    return response
+
+
+async def _afetch(url: str, headers: dict[str, str], client: httpx.AsyncClient) -> httpx.Response:
+    try:
+        response = await client.get(url, headers=headers, timeout=10)
+    except httpx.HTTPError as e:
+        raise ValueError(f"Failed to retrieve content from URL: {url}. Error: {e}")
+    return response
+
+
+def _mobile_fallback_url(url: str) -> Union[str, None]:
+    # fallback to mobile Wikipedia if available
+    if "wikipedia.org" in url and ".m.wikipedia.org" not in url:
+        # Try to convert to mobile URL generically
+        return url.replace(".wikipedia.org", ".m.wikipedia.org")
+    return None
+
+
+def _page_source_url(url: str) -> str:
+    # in "api" mode Wikipedia articles are fetched as plain text instead of the full skin HTML
+    if PAGE_SOURCE == "api":
+        api_url = wiki_api_url(url)
+        if api_url is not None:
+            return api_url
+    return url
+
+
+def _prepare_page_request(url: str) -> tuple[Union[dict, None], str, dict[str, str]]:
+    cached = page_cache.get(url)
+    if cached is not None and cached.get("format") != TEXT_FORMAT:
+        # extracted with an older text format; fetch the page again
+        cached = None
+    # revalidate against whichever URL (desktop, mobile or API) the cached copy came from
+    source_url = cached["source_url"] if cached is not None else _page_source_url(url)
+    headers = {"User-Agent": "Mozilla/5.0"}
+    if cached is not None:
+        headers.update(PageCache.conditional_headers(cached))
+    return cached, source_url, headers
+
+
+def _page_from_cache(url: str, cached: dict, revalidated: bool) -> WikiPage:
+    if revalidated:
+        page_cache.record_revalidated(cached.get("size", 0))
+        page_cache.put(url, cached)
+    else:
+        page_cache.record_hit()
+    return WikiPage(text=cached["text"], revision=cached["revision"])
+
+
+def _parse_and_cache_page(url: str, source_url: str, content: bytes, headers) -> WikiPage:
+    extract = extract_api_json if is_wiki_api_url(source_url) else html_extractor
+    wiki_text, revision = extract(content)
+
+    page_cache.record_miss(len(content))
+    page_cache.put(url, {
+        "format": TEXT_FORMAT,
+        "source_url": source_url,
+        "text": wiki_text,
+        "revision": revision,
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+        "size": len(content),
+    })
+    return WikiPage(text=wiki_text, revision=revision)
+
+
+def get_wiki_page(url: str) -> WikiPage:
+    cached, source_url, headers = _prepare_page_request(url)
+    if cached is not None and page_cache.is_fresh(cached):
+        return _page_from_cache(url, cached, revalidated=False)
+
+    response = _fetch(source_url, headers)
+    if response.status_code == 304 and cached is not None:
+        return _page_from_cache(url, cached, revalidated=True)
 
     if not response.ok:
-        # fallback to mobile Wikipedia if available
-        if "wikipedia.org" in url:
-            # Try to convert to mobile URL generically
-            if ".m.wikipedia.org" not in url:
-                mobile_url = url.replace(".wikipedia.org", ".m.wikipedia.org")
-                try:
-                    response = session.get(
-                        mobile_url, headers={"User-Agent": "Mozilla/5.0"}, timeout=10
-                    )
-                except requests.RequestException as e:
-                    raise ValueError(
-                        f"Failed to retrieve content from URL: {url}. Error: {e}"
-                    )
-                if not response.ok:
-                    raise ValueError(
-                        f"Failed to retrieve content from URL: {url}. Status: {response.status_code} {response.reason}"
-                    )
-        else:
+        source_url = _mobile_fallback_url(url)
+        if source_url is None:
+            raise ValueError(
+                f"Failed to retrieve content from URL: {url}. Status: {response.status_code} {response.reason}"
+            )
+        response = _fetch(source_url, {"User-Agent": "Mozilla/5.0"})
+        if not response.ok:
             raise ValueError(
                 f"Failed to retrieve content from URL: {url}. Status: {response.status_code} {response.reason}"
             )
 
-    soup = BeautifulSoup(response.content, "html.parser")
-    paragraphs = soup.find_all("p")
-    wiki_text = "\n".join(
-        paragraph.get_text() for paragraph in paragraphs if paragraph.get_text().strip()
-    )
+    return _parse_and_cache_page(url, source_url, response.content, response.headers)
 
-    return wiki_text
 
+async def aget_wiki_page(url: str, client: httpx.AsyncClient) -> WikiPage:
+    """Async variant of get_wiki_page; the HTML parse runs in a worker thread."""
+    cached, source_url, headers = await asyncio.to_thread(_prepare_page_request, url)
+    if cached is not None and page_cache.is_fresh(cached):
+        return _page_from_cache(url, cached, revalidated=False)
 
-def search_for_wikipedia_page_url(query: str, language: str = "en", top_k: int = 3) -> Union[list[str], None]:
+    response = await _afetch(source_url, headers, client)
+    if response.status_code == 304 and cached is not None:
+        return await asyncio.to_thread(_page_from_cache, url, cached, True)
+
+    if response.status_code >= 400:
+        source_url = _mobile_fallback_url(url)
+        if source_url is None:
+            raise ValueError(
+                f"Failed to retrieve content from URL: {url}. Status: {response.status_code} {response.reason_phrase}"
+            )
+        response = await _afetch(source_url, {"User-Agent": "Mozilla/5.0"}, client)
+        if response.status_code >= 400:
+            raise ValueError(
+                f"Failed to retrieve content from URL: {url}. Status: {response.status_code} {response.reason_phrase}"
+            )
+
+    return await asyncio.to_thread(_parse_and_cache_page, url, source_url, response.content, response.headers)
+
+
+def _search_request(query: str, language: str, top_k: int) -> tuple[str, dict, dict[str, str]]:
     # search for the most relevant Wikipedia page for the given query using Wikipedia's search API
     search_url = f"https://{language}.wikipedia.org/w/api.php"
     params = {
@@ -59,14 +182,11 @@ def search_for_wikipedia_page_url(query: str, language: str = "en", top_k: int =
     }
 
     # provide a User-Agent header to avoid 403 Forbidden responses from the Wikipedia API
-    headers = {"User-Agent": "wiki-assistant/1.0 (https://github.com)"} 
+    headers = {"User-Agent": "wiki-assistant/1.0 (https://github.com)"}
+    return search_url, params, headers
 
-    try:
-        response = requests.get(search_url, params=params, headers=headers, timeout=10)
-        response.raise_for_status()
-    except requests.RequestException as e:
-        raise ValueError(f"Failed to search Wikipedia for query: {query}. Error: {e}")
-    data = response.json()
+
+def _search_results_to_urls(data: dict, language: str) -> Union[list[str], None]:
     search_results = data.get("query", {}).get("search", [])
     if not search_results:
         return None
@@ -77,39 +197,176 @@ def search_for_wikipedia_page_url(query: str, language: str = "en", top_k: int =
     return page_urls
 
 
-def split_text_into_chunks(
-    text: str, chunk_size: int = 1000, overlap: int = 200
-) -> list[str]:
-    chunks = []
+def search_for_wikipedia_page_url(query: str, language: str = "en", top_k: int = 3) -> Union[list[str], None]:
+    search_url, params, headers = _search_request(query, language, top_k)
+    try:
+        response = requests.get(search_url, params=params, headers=headers, timeout=10)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        raise ValueError(f"Failed to search Wikipedia for query: {query}. Error: {e}")
+    return _search_results_to_urls(response.json(), language)
+
+
+async def asearch_for_wikipedia_page_url(
+    query: str, client: httpx.AsyncClient, language: str = "en", top_k: int = 3
+) -> Union[list[str], None]:
+    search_url, params, headers = _search_request(query, language, top_k)
+    try:
+        response = await client.get(search_url, params=params, headers=headers, timeout=10)
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        raise ValueError(f"Failed to search Wikipedia for query: {query}. Error: {e}")
+    return _search_results_to_urls(response.json(), language)
+
+
+class Chunk(NamedTuple):
+    text: str
+    # section path of the chunk, e.g. "History > Early years"; empty for the lead section
+    section: str
+
+
+def estimate_tokens(text: str) -> int:
+    # cheap stand-in for a wordpiece tokenizer: one token per CJK character or
+    # punctuation mark, and about 1.3 tokens per other word
+    cjk = len(CJK_PATTERN.findall(text))
+    words = len(re.findall(r"[^\W_]+", CJK_PATTERN.sub(" ", text)))
+    punctuation = len(re.findall(r"[^\w\s]", text))
+    return cjk + math.ceil(words * 1.3) + punctuation
+
+
+def _split_sentences(paragraph: str) -> list[str]:
+    sentences = []
     start = 0
-    text_length = len(text)
+    for match in SENTENCE_BOUNDARY.finditer(paragraph):
+        if match.end() > start:
+            sentences.append(paragraph[start:match.end()])
+            start = match.end()
+    if start < len(paragraph):
+        sentences.append(paragraph[start:])
+    return sentences
+
+
+def _split_oversized(sentence: str, max_tokens: int, count_tokens: Callable[[str], int]) -> Iterator[str]:
+    # a single sentence above the limit is cut between words (or CJK characters)
+    piece = ""
+    for unit in re.findall(f"[{CJK_RANGES}]|[^\\s{CJK_RANGES}]+\\s*|\\s+", sentence):
+        if piece and count_tokens(piece + unit) > max_tokens:
+            yield piece
+            piece = ""
+        piece += unit
+    if piece:
+        yield piece
 
-    while start < text_length:
-        end = min(start + chunk_size, text_length)
-        chunk = text[start:end]
-        chunks.append(chunk)
-        start += chunk_size - overlap
 
-    return chunks
+def iter_text_chunks(
+    text: str,
+    max_tokens: int = 200,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+) -> Iterator[Chunk]:
+    """Stream chunks of at most ``max_tokens`` (section label included) that break only at sentence boundaries.
 
+    Paragraphs are kept together when they fit, chunks never span two sections, and
+    there is no overlap between consecutive chunks.
+    """
+    section = ""
+    budget = max_tokens
+    parts: list[str] = []
+    used = 0
 
-def query_chunks_with_query(
+    def flush() -> Iterator[Chunk]:
+        nonlocal parts, used
+        body = "".join(parts).strip()
+        if body:
+            yield Chunk(text=body, section=section)
+        parts, used = [], 0
+
+    h2 = ""
+    for line in text.split("\n"):
+        heading = HEADING_PATTERN.match(line)
+        if heading:
+            yield from flush()
+            if len(heading.group(1)) == 2:
+                h2 = heading.group(2)
+                section = h2
+            else:
+                section = f"{h2} > {heading.group(2)}" if h2 else heading.group(2)
+            budget = max(max_tokens - count_tokens(f"[{section}]"), max_tokens // 2) if section else max_tokens
+            continue
+        if not line.strip():
+            continue
+
+        # start a paragraph on a fresh chunk when the whole paragraph does not fit in the current one
+        if parts and used + count_tokens(line) > budget:
+            yield from flush()
+        elif parts:
+            parts.append("\n")
+        for sentence in _split_sentences(line):
+            sentence_tokens = count_tokens(sentence)
+            if sentence_tokens > budget:
+                yield from flush()
+                for piece in _split_oversized(sentence, budget, count_tokens):
+                    parts = [piece]
+                    yield from flush()
+                continue
+            if parts and used + sentence_tokens > budget:
+                yield from flush()
+            parts.append(sentence)
+            used += sentence_tokens
+    yield from flush()
+
+
+def format_chunk(chunk: Chunk) -> str:
+    # the section path is kept in the chunk text, so it is embedded and shown to the LLM with it
+    if chunk.section:
+        return f"[{chunk.section}]\n{chunk.text}"
+    return chunk.text
+
+
+def embed_texts(texts: list[str], model: SentenceTransformer) -> np.ndarray:
+    # normalized float32 vectors, so cosine similarity is a plain dot product
+    return model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+
+
+def score_chunks(
     chunks: list[str],
-    query: str,
-    embedding_model: str = "all-MiniLM-L6-v2",
+    chunk_embeddings: np.ndarray,
+    query_embedding: np.ndarray,
     top_k: int = 5,
-) -> Union[list[str], None]:
-
-    model = SentenceTransformer(embedding_model)
-    query_embedding = model.encode(query, convert_to_tensor=True)
-    chunk_embeddings = model.encode(chunks, convert_to_tensor=True)
+) -> list[tuple[str, float]]:
+    # best top_k chunks with their cosine similarity to the query, best first
+    if not chunks:
+        return []
+    top_results = util.semantic_search(query_embedding, chunk_embeddings, top_k=top_k)[0]
+    return [(chunks[result["corpus_id"]], float(result["score"])) for result in top_results]
 
-    top_results = util.semantic_search(query_embedding, chunk_embeddings, top_k=top_k)[
-        0
-    ]
 
-    if not top_results:
+def search_chunks(
+    chunks: list[str],
+    chunk_embeddings: np.ndarray,
+    query_embedding: np.ndarray,
+    top_k: int = 5,
+) -> Union[list[str], None]:
+    scored = score_chunks(chunks, chunk_embeddings, query_embedding, top_k=top_k)
+    if not scored:
         return None
-    relevant_chunks = [chunks[result["corpus_id"]] for result in top_results]
+    relevant_chunks = [chunk for chunk, _ in scored]
 
     return relevant_chunks
+
+
+def hybrid_query_chunks(
+    chunks: list[str],
+    query: str,
+    chunk_embeddings: np.ndarray,
+    bm25_index: BM25Index,
+    query_embedding: np.ndarray,
+    top_k: int = 5,
+    rrf_k: int = 60,
+) -> Union[list[str], None]:
+    # fuse the full dense ranking with the BM25 ranking using reciprocal-rank fusion
+    if not chunks:
+        return None
+    dense_ranking = np.argsort(-(np.asarray(chunk_embeddings) @ query_embedding)).tolist()
+    lexical_ranking = bm25_index.top_n(query, len(chunks))
+    fused = reciprocal_rank_fusion([dense_ranking, lexical_ranking], k=rrf_k)[:top_k]
+    return [chunks[i] for i in fused]
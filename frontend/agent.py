@@ -1,12 +1,19 @@
+from collections import OrderedDict
 from dotenv import load_dotenv
 import dspy
-import requests
+import functools
+import inspect
+import json
 import os
+import threading
+from dspy.streaming import StatusMessageProvider, StreamListener
+from urllib.parse import unquote
 
 
 load_dotenv()
 
-from config import BACKEND_URL
+import backend_client
+from config import FANOUT_TOP_K
 
 
 
@@ -20,23 +27,187 @@ def search_for_relevant_wiki_pages(keyword: str) -> list[str]:
     """
 
 
-    response = requests.get(f"{BACKEND_URL}/explore", params={"query": keyword})
+    response = backend_client.get("/explore", params={"query": keyword, "prefetch": "true"})
     if response.status_code != 200:
         raise ValueError(f"Error searching for Wikipedia pages: {response.text}")
     data = response.json()
+    if "error" in data:
+        raise ValueError(f"Error searching for Wikipedia pages: {data['error']}")
     return data.get("page_urls", [])
 
 
 def search_for_relevant_chunks(url: str, query: str) -> list[str]:
     """Search for relevant chunks in a Wikipedia page given a URL and query."""
 
-    response = requests.get(f"{BACKEND_URL}/query", params={"url": url, "query": query})
+    response = backend_client.get("/query", params={"url": url, "query": query})
     if response.status_code != 200:
         raise ValueError(f"Error querying Wikipedia page: {response.text}")
     data = response.json()
+    if "error" in data:
+        raise ValueError(f"Error querying Wikipedia page: {data['error']}")
     return data.get("relevant_chunks", [])
 
 
+def search_for_relevant_chunks_in_pages(urls: list[str], queries: list[str]) -> dict[str, dict[str, list[str]]]:
+    """
+    Search several Wikipedia pages with one or more queries in a single call.
+    Every query is run against every URL, so use this to check several candidate pages at once.
+    Returns a mapping of URL -> query -> relevant chunks.
+    """
+
+    items = [{"url": url, "query": query} for url in urls for query in queries]
+    response = backend_client.post("/query/batch", json={"items": items})
+    if response.status_code != 200:
+        raise ValueError(f"Error querying Wikipedia pages: {response.text}")
+    data = response.json()
+    if "error" in data:
+        raise ValueError(f"Error querying Wikipedia pages: {data['error']}")
+    results = {}
+    for result in data.get("results", []):
+        chunks = result.get("relevant_chunks") or [f"Error: {result.get('error', 'no relevant chunks')}"]
+        results.setdefault(result["url"], {})[result["query"]] = chunks
+    return results
+
+
+def search_for_relevant_chunks_across_pages(urls: list[str], query: str) -> dict[str, list[dict[str, str]] | dict[str, str]]:
+    """
+    Search several Wikipedia pages for one query at the same time.
+    Returns "results": the most relevant chunks of all the pages together, best first, each with the URL
+    it came from, and "errors": URL -> error for the pages that could not be read.
+    Use this to check several candidate pages in a single step.
+    """
+
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return {"results": [], "errors": {}}
+    items = [{"url": url, "query": query} for url in urls]
+    response = backend_client.post(
+        "/query/batch", json={"items": items, "top_k": FANOUT_TOP_K, "with_scores": True}
+    )
+    if response.status_code != 200:
+        raise ValueError(f"Error querying Wikipedia pages: {response.text}")
+    data = response.json()
+    if "error" in data:
+        raise ValueError(f"Error querying Wikipedia pages: {data['error']}")
+    ranked = []
+    errors = {}
+    for result in data.get("results", []):
+        if "error" in result:
+            errors[result["url"]] = result["error"]
+            continue
+        chunks = result.get("relevant_chunks") or []
+        ranked.extend((score, result["url"], chunk) for chunk, score in zip(chunks, result.get("scores", [])))
+    # scores are cosine similarities to the same query embedding, so they compare across pages
+    ranked.sort(key=lambda item: item[0], reverse=True)
+    results = []
+    seen = set()
+    for _, url, chunk in ranked:
+        if chunk in seen:
+            continue
+        seen.add(chunk)
+        results.append({"url": url, "chunk": chunk})
+        if len(results) == FANOUT_TOP_K:
+            break
+    return {"results": results, "errors": errors}
+
+
+class ToolMemo:
+    """
+    Bounded LRU of tool results for one chat session, so the agent repeating a call
+    (within one answer or across follow-up questions) skips the backend round trip.
+    get returns ToolMemo.MISSING for unknown keys, since None is a valid tool result.
+    """
+
+    MISSING = object()
+
+    def __init__(self, max_items: int = 128):
+        self.max_items = max_items
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._results:
+                self.misses += 1
+                return self.MISSING
+            self._results.move_to_end(key)
+            self.hits += 1
+            return self._results[key]
+
+    def put(self, key, result):
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_items:
+                self._results.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._results), "hits": self.hits, "misses": self.misses}
+
+
+def memoized(tool, language: str):
+    """
+    Wrap a tool so its results are kept in the ToolMemo set with dspy.context(tool_memo=...),
+    keyed by tool name, arguments and language. Without a memo in the context the tool runs as is;
+    failed calls raise, so they are not memoized (the tools raise on backend errors instead of
+    returning an empty result).
+    """
+    signature = inspect.signature(tool)
+
+    @functools.wraps(tool)
+    def wrapper(*args, **kwargs):
+        memo = getattr(dspy.settings, "tool_memo", None)
+        if memo is None:
+            return tool(*args, **kwargs)
+        arguments = signature.bind(*args, **kwargs).arguments
+        key = (tool.__name__, json.dumps(arguments, sort_keys=True, default=str), language)
+        result = memo.get(key)
+        if result is ToolMemo.MISSING:
+            result = tool(*args, **kwargs)
+            memo.put(key, result)
+        return result
+
+    return wrapper
+
+
+def page_title(url: str) -> str:
+    """Readable article title of a Wikipedia URL, for status messages."""
+    return unquote(url.rstrip("/").rsplit("/", 1)[-1]).replace("_", " ")
+
+
+def source_urls(trajectory: dict) -> list[str]:
+    """URLs of the pages the agent read, in order, from a ReAct trajectory."""
+    urls = []
+    for name, args in trajectory.items():
+        if name.startswith("tool_args_") and isinstance(args, dict):
+            urls.extend([args["url"]] if "url" in args else args.get("urls", []))
+    return list(dict.fromkeys(urls))
+
+
+class ToolStatusMessages(StatusMessageProvider):
+    """One short progress line per tool call, shown while the agent works."""
+
+    def tool_start_status_message(self, instance, inputs):
+        args = inputs.get("kwargs", inputs)
+        if instance.name == "search_for_relevant_wiki_pages":
+            return f"Searching Wikipedia for \"{args.get('keyword', '')}\""
+        if instance.name == "search_for_relevant_chunks":
+            return f"Reading {page_title(args.get('url', ''))}: {args.get('query', '')}"
+        if instance.name == "search_for_relevant_chunks_across_pages":
+            titles = ", ".join(page_title(url) for url in args.get("urls", []))
+            return f"Reading {titles}: {args.get('query', '')}"
+        if instance.name == "search_for_relevant_chunks_in_pages":
+            titles = ", ".join(page_title(url) for url in args.get("urls", []))
+            return f"Reading {titles}: {'; '.join(args.get('queries', []))}"
+        return f"Calling {instance.name}"
+
+    def tool_end_status_message(self, outputs):
+        return None
+
+
 class QASignature(dspy.Signature):
     """Given a user question and chat history, return an answer."""
 
@@ -46,10 +217,23 @@ class QASignature(dspy.Signature):
     answer: str = dspy.OutputField(desc="Answer to the user question")
 
 
+# "sequential" reads pages with the one-page tools; "parallel" steers the agent to the fan-out tool
+# so broad questions need fewer reasoning iterations
+AGENT_MODES = ("sequential", "parallel")
+
+PARALLEL_INSTRUCTIONS = (
+    " To read Wikipedia pages, prefer search_for_relevant_chunks_across_pages with every candidate URL at once"
+    " over reading the pages one by one."
+)
+
+
 class WikiAssistantAgent(dspy.Module):
-    def __init__(self, language: str = "en", max_iterations: int = 10):
+    def __init__(self, language: str = "en", max_iterations: int = 10, mode: str = "sequential"):
+        if mode not in AGENT_MODES:
+            raise ValueError(f"Unknown agent mode {mode!r}; expected one of {AGENT_MODES}")
         self.max_iterations = max_iterations
         self.language = language
+        self.mode = mode
         
         def search_for_relevant_wiki_pages(keyword: str) -> list[str]:
             """
@@ -59,21 +243,51 @@ class WikiAssistantAgent(dspy.Module):
             Only accept one keyword per search, and return a list of relevant Wikipedia page URLs.
             Try to search for a general keyword rather than a specific one.
             """
-            response = requests.get(f"{BACKEND_URL}/explore", params={"query": keyword, "language": self.language})
+            response = backend_client.get("/explore", params={"query": keyword, "language": self.language, "prefetch": "true"})
             if response.status_code != 200:
                 raise ValueError(f"Error searching for Wikipedia pages: {response.text}")
             data = response.json()
+            if "error" in data:
+                raise ValueError(f"Error searching for Wikipedia pages: {data['error']}")
             return data.get("page_urls", [])
 
-        self.agent = dspy.ReAct(
-            QASignature,
-            tools=[
+        if mode == "parallel":
+            signature = QASignature.with_instructions(QASignature.instructions + PARALLEL_INSTRUCTIONS)
+            tools = (
                 search_for_relevant_wiki_pages,
+                search_for_relevant_chunks_across_pages,
                 search_for_relevant_chunks,
-            ],
+            )
+        else:
+            signature = QASignature
+            tools = (
+                search_for_relevant_wiki_pages,
+                search_for_relevant_chunks,
+                search_for_relevant_chunks_in_pages,
+            )
+
+        self.agent = dspy.ReAct(
+            signature,
+            tools=[memoized(tool, self.language) for tool in tools],
             max_iters=self.max_iterations,
         )
 
     def forward(self, question, past_messages, language=None):
         # language argument is accepted for compatibility but self.language from init is used
         return self.agent(past_messages=past_messages, question=question, language=self.language).answer
+
+    def stream(self, question, past_messages):
+        """
+        Run the agent and yield its progress as it happens:
+        dspy.streaming.StatusMessage for each tool call, dspy.streaming.StreamResponse for each
+        token of the final answer, and finally the complete dspy.Prediction.
+        Must be consumed inside the dspy.context that sets the LM (and the session's ToolMemo, if any).
+        """
+        # built per call: stream listeners keep per-stream state, and the agent itself is shared between sessions
+        stream_agent = dspy.streamify(
+            self.agent,
+            status_message_provider=ToolStatusMessages(),
+            stream_listeners=[StreamListener(signature_field_name="answer")],
+            async_streaming=False,
+        )
+        return stream_agent(past_messages=past_messages, question=question, language=self.language)
@@ -0,0 +1,43 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import BACKEND_CONNECT_TIMEOUT, BACKEND_READ_TIMEOUT, BACKEND_URL
+
+
+# One keep-alive session for every backend call from the UI, the agent tools and background threads.
+# Only idempotent methods are retried, and only when the connection itself failed.
+_session = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.2),
+)
+_session.mount("http://", _adapter)
+_session.mount("https://", _adapter)
+
+
+def request(method: str, path: str, **kwargs) -> requests.Response:
+    """Send a request to the backend API; ``path`` is relative to BACKEND_URL."""
+    kwargs.setdefault("timeout", (BACKEND_CONNECT_TIMEOUT, BACKEND_READ_TIMEOUT))
+    return _session.request(method, f"{BACKEND_URL}{path}", **kwargs)
+
+
+def get(path: str, **kwargs) -> requests.Response:
+    return request("GET", path, **kwargs)
+
+
+def post(path: str, **kwargs) -> requests.Response:
+    return request("POST", path, **kwargs)
+
+
+def put(path: str, **kwargs) -> requests.Response:
+    return request("PUT", path, **kwargs)
+
+
+def patch(path: str, **kwargs) -> requests.Response:
+    return request("PATCH", path, **kwargs)
+
+
+def delete(path: str, **kwargs) -> requests.Response:
+    return request("DELETE", path, **kwargs)
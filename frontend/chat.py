@@ -1,18 +1,35 @@
 import streamlit as st
 import dspy
 import os
+import threading
 
-from agent import WikiAssistantAgent
-from config import USERNAME
+from agent import ToolMemo, WikiAssistantAgent, page_title, source_urls
+from config import (
+    AGENT_MODE,
+    ANSWER_CACHE,
+    CONTEXT_KEEP_TURNS,
+    CONTEXT_TOKEN_BUDGET,
+    LLM_MODEL,
+    MESSAGE_PAGE_SIZE,
+    SIDEBAR_PAGE_SIZE,
+    SUMMARY_MIN_MESSAGES,
+    TITLE_MODEL,
+    TOOL_MEMO_SIZE,
+    USERNAME,
+)
+from context_window import SummarizeConversation, build_past_messages, fold_into_summary, summary_cutoff
 from utils import (
-    get_sessions,
+    get_sidebar,
     create_session,
-    get_session_messages,
-    update_session_messages,
+    get_session,
+    lookup_cached_answer,
+    store_cached_answer,
+    append_session_messages,
+    edit_session_message,
+    SessionVersionConflict,
     update_session_title,
     update_session_folder,
     delete_session,
-    get_folders,
     create_folder,
     delete_folder
 )
@@ -37,7 +54,11 @@ TRANSLATIONS = {
         "uncategorized": "Uncategorized",
         "edit": "Edit",
         "save": "Save",
-        "cancel": "Cancel"
+        "cancel": "Cancel",
+        "steps": "Steps",
+        "load_older": "Load earlier messages",
+        "load_more_chats": "Show older chats",
+        "cached_answer": "Answered from cache"
     },
     "zh": {
         "title": "維基百科聊天助手",
@@ -57,7 +78,11 @@ TRANSLATIONS = {
         "uncategorized": "未分類",
         "edit": "編輯",
         "save": "儲存",
-        "cancel": "取消"
+        "cancel": "取消",
+        "steps": "步驟",
+        "load_older": "載入較早的訊息",
+        "load_more_chats": "顯示較早的對話",
+        "cached_answer": "來自快取的回答"
     },
     # ... (Other languages omitted for brevity, defaulting to English if missing)
 }
@@ -211,6 +236,108 @@ if "user_avatar" not in st.session_state:
     st.session_state.user_avatar = "👤"
 if "editing_message_index" not in st.session_state:
     st.session_state.editing_message_index = None
+if "session_version" not in st.session_state:
+    st.session_state.session_version = None
+if "messages_offset" not in st.session_state:
+    # position of st.session_state.messages[0] in the session; older messages are loaded on demand
+    st.session_state.messages_offset = 0
+if "sidebar_limit" not in st.session_state:
+    # number of newest sessions listed in the sidebar; grows when older chats are requested
+    st.session_state.sidebar_limit = SIDEBAR_PAGE_SIZE
+if "rolling_summary" not in st.session_state:
+    # (summary, summary_upto) of the current chat under "current"; a background fold replaces the pair once
+    # its summary is stored, and a new dict is started whenever another chat is opened
+    st.session_state.rolling_summary = {"current": ("", 0)}
+if "tool_memo" not in st.session_state:
+    # agent tool results for the current chat; a new one is started whenever another chat is opened
+    st.session_state.tool_memo = ToolMemo(TOOL_MEMO_SIZE)
+
+
+@st.cache_resource
+def get_lm(model):
+    """One LM client per model and process, reused across reruns and sessions."""
+    return dspy.LM(model, api_key=os.getenv("GEMINI_API_KEY"))
+
+
+@st.cache_resource
+def get_agent(language, mode):
+    """One agent (and its ReAct program) per language, mode and process."""
+    return WikiAssistantAgent(language=language, mode=mode)
+
+
+@st.cache_resource
+def get_title_generator():
+    return dspy.Predict("messages -> title")
+
+
+@st.cache_resource
+def get_summarizer():
+    return dspy.Predict(SummarizeConversation)
+
+
+def generate_title(session_id, prompt, lm, title_generator):
+    """Name a new chat from its first message; runs in a background thread next to the agent."""
+    try:
+        # dspy settings are per thread, so the LM is set here rather than inherited
+        with dspy.context(lm=lm):
+            new_title = title_generator(messages=str(prompt)).title
+        # Ensure title is short
+        if len(new_title) > 20:
+            new_title = new_title[:20] + "..."
+    except Exception:
+        # Fallback
+        new_title = prompt[:20] + "..." if len(prompt) > 20 else prompt
+    try:
+        update_session_title(session_id, new_title)
+    except Exception as e:
+        print(f"Error saving session title: {e}")
+
+
+def cache_answer(question, language, answer, sources):
+    """Add a fresh agent answer to the semantic answer cache; runs in a background thread."""
+    try:
+        store_cached_answer(question, language, answer, sources)
+    except Exception as e:
+        print(f"Error caching answer: {e}")
+
+
+def open_session(session_id, messages=None, version=0):
+    """Make a session current; loads its newest messages and version from the backend unless given."""
+    offset = 0
+    summary = ("", 0)
+    if messages is None:
+        session = get_session(session_id, message_limit=MESSAGE_PAGE_SIZE)
+        messages = session.get("messages", [])
+        version = session.get("version")
+        offset = session.get("messages_offset", 0)
+        summary = (session.get("summary", ""), session.get("summary_upto", 0))
+    if session_id != st.session_state.current_session_id:
+        st.session_state.tool_memo = ToolMemo(TOOL_MEMO_SIZE)
+    st.session_state.current_session_id = session_id
+    st.session_state.messages = messages
+    st.session_state.session_version = version
+    st.session_state.messages_offset = offset
+    st.session_state.rolling_summary = {"current": summary}
+
+
+def load_older_messages():
+    session = get_session(
+        st.session_state.current_session_id,
+        message_limit=MESSAGE_PAGE_SIZE,
+        before=st.session_state.messages_offset,
+    )
+    st.session_state.messages = session.get("messages", []) + st.session_state.messages
+    st.session_state.messages_offset = session.get("messages_offset", 0)
+    st.session_state.editing_message_index = None
+
+
+def close_session():
+    st.session_state.current_session_id = None
+    st.session_state.messages = []
+    st.session_state.session_version = None
+    st.session_state.messages_offset = 0
+    st.session_state.rolling_summary = {"current": ("", 0)}
+    st.session_state.tool_memo = ToolMemo(TOOL_MEMO_SIZE)
 
 # Sidebar
 with st.sidebar:
@@ -249,8 +376,9 @@ with st.sidebar:
             create_folder(new_folder_name)
             st.rerun()
 
-    folders = get_folders()
-    sessions = get_sessions()
+    sidebar = get_sidebar(st.session_state.sidebar_limit)
+    folders = sidebar["folders"]
+    sessions = sidebar["sessions"]
     
     # Organize sessions by folder
     sessions_by_folder = {None: []} # None for Uncategorized
@@ -271,15 +399,13 @@ with st.sidebar:
             col1, col2 = st.columns([0.8, 0.2])
             with col1:
                 if st.button(session["title"], key=f"sess_{session['id']}", use_container_width=True):
-                    st.session_state.current_session_id = session["id"]
-                    st.session_state.messages = get_session_messages(session["id"])
+                    open_session(session["id"])
                     st.rerun()
             with col2:
                 if st.button("🗑️", key=f"del_{session['id']}"):
                     delete_session(session["id"])
                     if st.session_state.current_session_id == session["id"]:
-                        st.session_state.current_session_id = None
-                        st.session_state.messages = []
+                        close_session()
                     st.rerun()
 
     # User Folders
@@ -293,22 +419,23 @@ with st.sidebar:
                 col1, col2 = st.columns([0.8, 0.2])
                 with col1:
                     if st.button(session["title"], key=f"sess_{session['id']}", use_container_width=True):
-                        st.session_state.current_session_id = session["id"]
-                        st.session_state.messages = get_session_messages(session["id"])
+                        open_session(session["id"])
                         st.rerun()
                 with col2:
                     if st.button("🗑️", key=f"del_{session['id']}"):
                         delete_session(session["id"])
                         if st.session_state.current_session_id == session["id"]:
-                            st.session_state.current_session_id = None
-                            st.session_state.messages = []
+                            close_session()
                         st.rerun()
 
+    if sidebar.get("has_more") and st.button(t["load_more_chats"], key="load_more_chats", use_container_width=True):
+        st.session_state.sidebar_limit += SIDEBAR_PAGE_SIZE
+        st.rerun()
+
     if st.button(t["new_chat"], use_container_width=True):
         # Create new chat in current folder context if possible, or Uncategorized
         new_session = create_session(t["new_chat"])
-        st.session_state.current_session_id = new_session["session_id"]
-        st.session_state.messages = []
+        open_session(new_session["session_id"], messages=[])
         st.rerun()
 
 # Apply Theme
@@ -320,14 +447,18 @@ st.title(t["title"])
 if not st.session_state.current_session_id:
     if not sessions:
         new_session = create_session(t["new_chat"])
-        st.session_state.current_session_id = new_session["session_id"]
-        st.session_state.messages = []
+        open_session(new_session["session_id"], messages=[])
     else:
-        st.session_state.current_session_id = sessions[0]["id"]
-        st.session_state.messages = get_session_messages(sessions[0]["id"])
+        open_session(sessions[0]["id"])
         
 # Session Folder Mover
 current_session_info = next((s for s in sessions if s["id"] == st.session_state.current_session_id), None)
+if current_session_info is None:
+    # a chat older than the sessions listed in the sidebar
+    try:
+        current_session_info = get_session(st.session_state.current_session_id, message_limit=0)
+    except ValueError:
+        current_session_info = None
 if current_session_info:
     folder_options = {"None": None}
     for f in folders:
@@ -344,7 +475,12 @@ if current_session_info:
 
 st.markdown(t["greeting"].format(user=st.session_state.username))
 
-# Display chat messages
+# Display chat messages: only the newest window is loaded; earlier ones on request
+if st.session_state.messages_offset > 0:
+    if st.button(t["load_older"], key="load_older"):
+        load_older_messages()
+        st.rerun()
+
 for i, message in enumerate(st.session_state.messages):
     avatar = st.session_state.user_avatar if message["role"] == "user" else "🤖"
     with st.chat_message(message["role"], avatar=avatar):
@@ -353,9 +489,20 @@ for i, message in enumerate(st.session_state.messages):
             col1, col2 = st.columns(2)
             with col1:
                 if st.button(t["save"], key=f"save_{i}"):
-                    st.session_state.messages[i]["content"] = new_content
                     st.session_state.editing_message_index = None
-                    update_session_messages(st.session_state.current_session_id, list(st.session_state.messages))
+                    try:
+                        index = st.session_state.messages_offset + i
+                        st.session_state.session_version = edit_session_message(
+                            st.session_state.current_session_id, index, new_content,
+                            expected_version=st.session_state.session_version
+                        )
+                        st.session_state.messages[i]["content"] = new_content
+                        # the backend drops a summary that covers the edited message
+                        if st.session_state.rolling_summary["current"][1] > index:
+                            st.session_state.rolling_summary["current"] = ("", 0)
+                    except SessionVersionConflict:
+                        # Someone else changed this chat; reload it instead of overwriting their edits
+                        open_session(st.session_state.current_session_id)
                     st.rerun()
             with col2:
                 if st.button(t["cancel"], key=f"cancel_{i}"):
@@ -373,50 +520,121 @@ for i, message in enumerate(st.session_state.messages):
 
 # Accept user input
 if prompt := st.chat_input(t["input_placeholder"]):
-    # Add user message
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    # Add user message; it reaches the backend together with the answer
+    user_message = {"role": "user", "content": prompt}
+    st.session_state.messages.append(user_message)
+    saved = False
     with st.chat_message("user", avatar=st.session_state.user_avatar):
         st.markdown(prompt)
 
-    # Smart Title Generation
-    if len(st.session_state.messages) == 1:
-        try:
-            # Use a separate lightweight call to generate title
-            lm_title = dspy.LM("gemini/gemini-2.5-flash", api_key=os.getenv("GEMINI_API_KEY"))
-            with dspy.context(lm=lm_title):
-                title_gen = dspy.Predict("messages -> title")
-                title_response = title_gen(messages=str(prompt))
-                new_title = title_response.title
-                # Ensure title is short
-                if len(new_title) > 20:
-                    new_title = new_title[:20] + "..."
-                update_session_title(st.session_state.current_session_id, new_title)
-        except Exception:
-            # Fallback
-            new_title = prompt[:20] + "..." if len(prompt) > 20 else prompt
-            update_session_title(st.session_state.current_session_id, new_title)
+    # Smart Title Generation: runs alongside the agent; the sidebar shows the title on the next rerun
+    if st.session_state.messages_offset == 0 and len(st.session_state.messages) == 1:
+        threading.Thread(
+            target=generate_title,
+            args=(st.session_state.current_session_id, prompt, get_lm(TITLE_MODEL), get_title_generator()),
+            daemon=True,
+        ).start()
 
     with st.chat_message("assistant", avatar="🤖"):
-        past_messages = st.session_state.messages[:-1]
-        lm = dspy.LM("gemini/gemini-2.5-flash", api_key=os.getenv("GEMINI_API_KEY"))
-        
-        wiki_assistant_agent = WikiAssistantAgent(language=language_code)
+        # Bounded context: the rolling summary of older turns plus the unsummarized recent ones
+        summary, summary_upto = st.session_state.rolling_summary["current"]
+        unsummarized = st.session_state.messages[max(0, summary_upto - st.session_state.messages_offset):-1]
+        past_messages = build_past_messages(unsummarized, summary, CONTEXT_TOKEN_BUDGET)
+        lm = get_lm(LLM_MODEL)
+        wiki_assistant_agent = get_agent(language_code, AGENT_MODE)
         
         try:
-            with st.spinner(t["loading"]):
-                with dspy.context(lm=lm):
-                    response = wiki_assistant_agent(
-                        question=prompt, past_messages=past_messages, language=language_code
-                    )
+            # Only a question without earlier context can reuse the answer to a similar one
+            use_answer_cache = ANSWER_CACHE and not past_messages
+            cached = None
+            if use_answer_cache:
+                try:
+                    cached = lookup_cached_answer(prompt, language_code)
+                except Exception as e:
+                    # the cache is an optimization; without it the agent answers as usual
+                    print(f"Error looking up cached answer: {e}")
+            if cached:
+                response = cached["answer"]
                 st.markdown(response)
+                sources = ", ".join(page_title(url) for url in cached.get("sources", []))
+                st.caption(f"{t['cached_answer']}: {sources}" if sources else t["cached_answer"])
+            else:
+                # Tool calls show up in the status box while the agent works; the answer streams token by token
+                status = st.status(t["loading"])
+                final = {}
+
+                def answer_tokens():
+                    streamed = False
+                    for event in wiki_assistant_agent.stream(question=prompt, past_messages=past_messages):
+                        if isinstance(event, dspy.streaming.StatusMessage):
+                            status.update(label=event.message)
+                            status.write(event.message)
+                        elif isinstance(event, dspy.streaming.StreamResponse):
+                            streamed = True
+                            yield event.chunk
+                        elif isinstance(event, dspy.Prediction):
+                            final["answer"] = event.answer
+                            final["sources"] = source_urls(event.trajectory)
+                            if not streamed:
+                                # cached LM responses arrive whole, without token chunks
+                                yield event.answer
+
+                with dspy.context(lm=lm, tool_memo=st.session_state.tool_memo):
+                    streamed_response = st.write_stream(answer_tokens())
+                status.update(label=t["steps"], state="complete", expanded=False)
+                response = final.get("answer", streamed_response)
+
+                if use_answer_cache and "answer" in final:
+                    threading.Thread(
+                        target=cache_answer,
+                        args=(prompt, language_code, response, final["sources"]),
+                        daemon=True,
+                    ).start()
             
             # Add assistant response
             st.session_state.messages.append({"role": "assistant", "content": response})
             
-            # Update backend
-            update_session_messages(st.session_state.current_session_id, list(st.session_state.messages))
+            # Update backend: append only the new question/answer pair
+            try:
+                st.session_state.session_version = append_session_messages(
+                    st.session_state.current_session_id,
+                    st.session_state.messages[-2:],
+                    expected_version=st.session_state.session_version
+                )
+            except SessionVersionConflict:
+                # The chat changed elsewhere; reload it and add our pair after its latest message
+                new_messages = st.session_state.messages[-2:]
+                open_session(st.session_state.current_session_id)
+                st.session_state.session_version = append_session_messages(
+                    st.session_state.current_session_id,
+                    new_messages,
+                    expected_version=st.session_state.session_version
+                )
+                st.session_state.messages.extend(new_messages)
+                st.rerun()
+            saved = True
+
+            # Fold turns that fell out of the verbatim window into the summary, off the critical path
+            message_count = st.session_state.messages_offset + len(st.session_state.messages)
+            cutoff = summary_cutoff(message_count, CONTEXT_KEEP_TURNS)
+            if cutoff - summary_upto >= SUMMARY_MIN_MESSAGES:
+                threading.Thread(
+                    target=fold_into_summary,
+                    args=(
+                        st.session_state.current_session_id, cutoff, get_lm(TITLE_MODEL), get_summarizer(),
+                        st.session_state.rolling_summary,
+                    ),
+                    daemon=True,
+                ).start()
             
         except Exception as e:
+            if not saved:
+                # Nothing of this turn reached the backend; drop it locally too, so that message
+                # positions (messages_offset + i) keep matching the stored conversation
+                messages = st.session_state.messages
+                turn_start = next((i for i, message in enumerate(messages) if message is user_message), None)
+                if turn_start is not None:
+                    del messages[turn_start:]
             st.error(f"An error occurred: {e}")
             # Optionally log the error or provide more details
             print(f"Error in agent execution: {e}")
@@ -1,4 +1,28 @@
 import os
 
 USERNAME = "Antigravity"
-BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
\ No newline at end of file
+BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
+# LiteLLM model names for the agent and for chat titles
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini/gemini-2.5-flash")
+TITLE_MODEL = os.getenv("TITLE_MODEL", LLM_MODEL)
+# Backend API timeouts in seconds; reads allow for a first /query that fetches and embeds a page
+BACKEND_CONNECT_TIMEOUT = float(os.getenv("BACKEND_CONNECT_TIMEOUT", "3"))
+BACKEND_READ_TIMEOUT = float(os.getenv("BACKEND_READ_TIMEOUT", "120"))
+# Messages loaded per page when a chat is opened or scrolled back
+MESSAGE_PAGE_SIZE = int(os.getenv("MESSAGE_PAGE_SIZE", "30"))
+# Sessions listed in the sidebar at first; each "show older chats" click adds this many more
+SIDEBAR_PAGE_SIZE = int(os.getenv("SIDEBAR_PAGE_SIZE", "200"))
+# Agent context: the last CONTEXT_KEEP_TURNS question/answer pairs are sent verbatim, older ones as a
+# rolling summary (refreshed once SUMMARY_MIN_MESSAGES unsummarized messages have piled up), within CONTEXT_TOKEN_BUDGET
+CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "4"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+SUMMARY_MIN_MESSAGES = int(os.getenv("SUMMARY_MIN_MESSAGES", "4"))
+# Tool results remembered per chat session, so repeated agent searches skip the backend
+TOOL_MEMO_SIZE = int(os.getenv("TOOL_MEMO_SIZE", "128"))
+# Agent mode ("sequential" or "parallel"); parallel reads several candidate pages per step with one
+# /query/batch call, keeping the FANOUT_TOP_K best chunks of all pages
+AGENT_MODE = os.getenv("AGENT_MODE", "sequential")
+FANOUT_TOP_K = int(os.getenv("FANOUT_TOP_K", "8"))
+# Opt-in semantic answer cache: a chat's first question is answered from the backend's cache
+# when a similar question in the same language was answered recently
+ANSWER_CACHE = os.getenv("ANSWER_CACHE", "false").lower() == "true"
@@ -0,0 +1,82 @@
+import math
+import re
+
+import dspy
+
+from utils import SessionVersionConflict, get_session, set_session_summary
+
+
+# one token per CJK character, about 1.3 per other word, one per punctuation mark
+CJK_CHAR = re.compile("[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]")
+WORD = re.compile(r"[^\W_]+")
+PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count, good enough to keep prompts under a budget."""
+    cjk = len(CJK_CHAR.findall(text))
+    words = len(WORD.findall(CJK_CHAR.sub(" ", text)))
+    return cjk + math.ceil(words * 1.3) + len(PUNCTUATION.findall(text))
+
+
+def build_past_messages(messages: list[dict], summary: str, token_budget: int) -> list[dict]:
+    """
+    Chat history for one agent call: the messages not yet covered by the rolling summary,
+    verbatim, preceded by the summary. Messages are added newest first until token_budget
+    (summary included) is spent, so the oldest unsummarized ones are dropped first.
+    """
+    summary_message = None
+    used = 0
+    if summary:
+        summary_message = {"role": "system", "content": f"Summary of the earlier conversation: {summary}"}
+        used = estimate_tokens(summary_message["content"])
+    recent = []
+    for message in reversed(messages):
+        tokens = estimate_tokens(message.get("content", ""))
+        if used + tokens > token_budget:
+            break
+        recent.append(message)
+        used += tokens
+    recent.reverse()
+    return ([summary_message] if summary_message else []) + recent
+
+
+class SummarizeConversation(dspy.Signature):
+    """Fold the new messages into the running summary of a conversation.
+    Keep the facts, names, Wikipedia pages and open questions that later turns may refer to; be concise."""
+
+    previous_summary: str = dspy.InputField(desc="Summary of the conversation so far (may be empty)")
+    messages: list = dspy.InputField(desc="Messages to add to the summary, oldest first")
+    summary: str = dspy.OutputField(desc="Updated summary")
+
+
+def summary_cutoff(message_count: int, keep_turns: int) -> int:
+    """Position before which messages are no longer kept verbatim and belong in the summary."""
+    return max(0, message_count - keep_turns * 2)
+
+
+def fold_into_summary(session_id, cutoff, lm, summarizer, rolling_summary):
+    """
+    Summarize messages [summary_upto, cutoff) into the session's rolling summary.
+    Runs in a background thread after an answer, so the next turn can use it. The summary is only
+    stored if the session is still at the version it was read at; otherwise (an edit, another fold
+    or a new turn in between) it is dropped and a later answer folds again. Once stored, it replaces
+    rolling_summary["current"], the chat's (summary, summary_upto) pair kept by the frontend.
+    """
+    try:
+        session = get_session(session_id, message_limit=0)
+        summary, summary_upto = session.get("summary", ""), session.get("summary_upto", 0)
+        if cutoff <= summary_upto:
+            return
+        older = get_session(session_id, message_limit=cutoff - summary_upto, before=cutoff)
+        if older.get("version") != session.get("version"):
+            raise SessionVersionConflict("Session changed while it was read")
+        # dspy settings are per thread, so the LM is set here rather than inherited
+        with dspy.context(lm=lm):
+            new_summary = summarizer(previous_summary=summary, messages=older.get("messages", [])).summary
+        set_session_summary(session_id, new_summary, cutoff, expected_version=session.get("version"))
+        rolling_summary["current"] = (new_summary, cutoff)
+    except SessionVersionConflict:
+        print(f"Skipped a stale conversation summary for session {session_id}")
+    except Exception as e:
+        print(f"Error updating conversation summary: {e}")
@@ -1,14 +1,12 @@
-from config import BACKEND_URL
-import requests
+import threading
+from typing import Union
 
-
-from config import BACKEND_URL
-import requests
+import backend_client
 
 
 def get_folders() -> list[dict]:
     """Retrieve all folders from the backend."""
-    response = requests.get(f"{BACKEND_URL}/folders")
+    response = backend_client.get("/folders")
     if response.status_code != 200:
         return []
     data = response.json()
@@ -17,7 +15,7 @@ def get_folders() -> list[dict]:
 
 def create_folder(name: str) -> dict:
     """Create a new folder."""
-    response = requests.post(f"{BACKEND_URL}/folders", params={"name": name})
+    response = backend_client.post("/folders", params={"name": name})
     if response.status_code != 200:
         raise ValueError(f"Error creating folder: {response.text}")
     return response.json()
@@ -25,18 +23,30 @@ def create_folder(name: str) -> dict:
 
 def delete_folder(folder_id: str) -> None:
     """Delete a specific folder."""
-    response = requests.delete(f"{BACKEND_URL}/folders/{folder_id}")
+    response = backend_client.delete(f"/folders/{folder_id}")
     if response.status_code != 200:
         raise ValueError(f"Error deleting folder: {response.text}")
 
 
-def get_sessions() -> list[dict]:
-    """Retrieve all sessions from the backend."""
-    response = requests.get(f"{BACKEND_URL}/sessions")
+# Last /sidebar response and its ETag; an unchanged sidebar is answered with a 304 and served from here
+_sidebar_cache = {"etag": None, "data": None}
+_sidebar_lock = threading.Lock()
+
+
+def get_sidebar(limit: int = 200) -> dict:
+    """Retrieve folders and the newest session summaries in one call, revalidated with ETag."""
+    with _sidebar_lock:
+        etag, cached = _sidebar_cache["etag"], _sidebar_cache["data"]
+    headers = {"If-None-Match": etag} if etag and cached is not None else {}
+    response = backend_client.get("/sidebar", params={"limit": limit}, headers=headers)
+    if response.status_code == 304:
+        return cached
     if response.status_code != 200:
-        return []
+        return {"folders": [], "sessions": [], "has_more": False}
     data = response.json()
-    return data.get("sessions", [])
+    with _sidebar_lock:
+        _sidebar_cache["etag"], _sidebar_cache["data"] = response.headers.get("ETag"), data
+    return data
 
 
 def create_session(title: str = "New Chat", folder_id: str = None) -> dict:
@@ -44,44 +54,109 @@ def create_session(title: str = "New Chat", folder_id: str = None) -> dict:
     params = {"title": title}
     if folder_id:
         params["folder_id"] = folder_id
-    response = requests.post(f"{BACKEND_URL}/sessions", params=params)
+    response = backend_client.post("/sessions", params=params)
     if response.status_code != 200:
         raise ValueError(f"Error creating session: {response.text}")
     return response.json()
 
 
-def get_session_messages(session_id: str) -> list[dict[str, str]]:
-    """Retrieve messages for a specific session."""
-    response = requests.get(f"{BACKEND_URL}/sessions/{session_id}")
+class SessionVersionConflict(ValueError):
+    """The session was changed by someone else since we last loaded it."""
+
+
+def get_session(session_id: str, message_limit: int = None, before: int = None) -> dict:
+    """
+    Retrieve a specific session, including its messages and version.
+    With message_limit, only the newest messages before position `before` are returned;
+    messages_offset is the position of the first of them.
+    """
+    params = {}
+    if message_limit is not None:
+        params["message_limit"] = message_limit
+    if before is not None:
+        params["before"] = before
+    response = backend_client.get(f"/sessions/{session_id}", params=params)
     if response.status_code != 200:
         raise ValueError(f"Error retrieving session: {response.text}")
     data = response.json()
-    return data.get("session", {}).get("messages", [])
+    return data.get("session", {})
 
 
-def update_session_messages(session_id: str, messages: list[dict[str, str]]) -> None:
-    """Update messages for a specific session."""
-    response = requests.put(f"{BACKEND_URL}/sessions/{session_id}", json=messages)
+def append_session_messages(session_id: str, messages: list[dict[str, str]], expected_version: int = None) -> int:
+    """Append messages to a session and return its new version."""
+    response = backend_client.post(
+        f"/sessions/{session_id}/messages",
+        json={"messages": messages, "expected_version": expected_version},
+    )
+    if response.status_code == 409:
+        raise SessionVersionConflict(f"Session was modified: {response.text}")
+    if response.status_code != 200:
+        raise ValueError(f"Error appending messages: {response.text}")
+    return response.json().get("version")
+
+
+def edit_session_message(session_id: str, index: int, content: str, expected_version: int = None) -> int:
+    """Edit a single message in a session and return its new version."""
+    response = backend_client.patch(
+        f"/sessions/{session_id}/messages/{index}",
+        json={"content": content, "expected_version": expected_version},
+    )
+    if response.status_code == 409:
+        raise SessionVersionConflict(f"Session was modified: {response.text}")
     if response.status_code != 200:
-        raise ValueError(f"Error updating session: {response.text}")
+        raise ValueError(f"Error editing message: {response.text}")
+    return response.json().get("version")
 
 
 def update_session_title(session_id: str, title: str) -> None:
     """Update title for a specific session."""
-    response = requests.put(f"{BACKEND_URL}/sessions/{session_id}/title", params={"title": title})
+    response = backend_client.put(f"/sessions/{session_id}/title", params={"title": title})
     if response.status_code != 200:
         raise ValueError(f"Error updating session title: {response.text}")
 
 
+def set_session_summary(session_id: str, summary: str, upto: int, expected_version: int = None) -> None:
+    """Store the rolling summary of a session's first `upto` messages, read at `expected_version`."""
+    response = backend_client.put(
+        f"/sessions/{session_id}/summary",
+        json={"summary": summary, "upto": upto, "expected_version": expected_version},
+    )
+    if response.status_code == 409:
+        raise SessionVersionConflict(f"Session was modified: {response.text}")
+    if response.status_code != 200:
+        raise ValueError(f"Error updating session summary: {response.text}")
+
+
 def update_session_folder(session_id: str, folder_id: str) -> None:
     """Update folder for a specific session."""
-    response = requests.put(f"{BACKEND_URL}/sessions/{session_id}/folder", params={"folder_id": folder_id})
+    response = backend_client.put(f"/sessions/{session_id}/folder", params={"folder_id": folder_id})
     if response.status_code != 200:
         raise ValueError(f"Error updating session folder: {response.text}")
 
 
 def delete_session(session_id: str) -> None:
     """Delete a specific session."""
-    response = requests.delete(f"{BACKEND_URL}/sessions/{session_id}")
+    response = backend_client.delete(f"/sessions/{session_id}")
     if response.status_code != 200:
         raise ValueError(f"Error deleting session: {response.text}")
+
+
+def lookup_cached_answer(question: str, language: str) -> Union[dict, None]:
+    """Cached answer (with "answer" and "sources") to a question similar to this one, or None."""
+    response = backend_client.post("/answers/lookup", json={"question": question, "language": language})
+    if response.status_code != 200:
+        return None
+    data = response.json()
+    return data if data.get("hit") else None
+
+
+def store_cached_answer(question: str, language: str, answer: str, sources: list[str]) -> None:
+    """Add an agent answer and the pages it was based on to the answer cache."""
+    response = backend_client.post(
+        "/answers", json={"question": question, "language": language, "answer": answer, "sources": sources}
+    )
+    if response.status_code != 200:
+        raise ValueError(f"Error caching answer: {response.text}")
+    data = response.json()
+    if "error" in data:
+        raise ValueError(f"Error caching answer: {data['error']}")